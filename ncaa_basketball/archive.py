@@ -0,0 +1,85 @@
+import json
+import os
+import zlib
+from dataclasses import asdict, dataclass
+from typing import Dict, Iterator, List, Tuple
+
+
+@dataclass
+class ArchiveEntry:
+    url: str
+    key: str
+    offset: int
+    length: int
+
+
+# An append only store of raw payloads, so data can be re-processed without
+# downloading it again. Each payload is compressed and appended to a data file,
+# and an index file maps its URL and key (game or player ID) to its position.
+# When a URL is stored again, the newest copy wins.
+class Archive:
+    def __init__(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        self.data_path = os.path.join(path, "payloads.dat")
+        self.index_path = os.path.join(path, "index.jsonl")
+        self.index: Dict[str, ArchiveEntry] = dict()
+
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r", encoding="UTF-8") as index_file:
+                for line in index_file:
+                    if line.strip():
+                        entry = ArchiveEntry(**json.loads(line))
+                        self.index[entry.url] = entry
+
+        self.data_file = open(self.data_path, "ab")
+        self.index_file = open(self.index_path, "a", encoding="UTF-8")
+
+    def __enter__(self) -> "Archive":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.data_file.close()
+        self.index_file.close()
+
+    def put(self, url: str, key: str, payload: str):
+        record = zlib.compress(payload.encode("UTF-8"))
+        entry = ArchiveEntry(url, key, self.data_file.tell(), len(record))
+
+        # Write the payload before the index, so the index never points past
+        # the end of the data.
+        self.data_file.write(record)
+        self.data_file.flush()
+        self.index_file.write(json.dumps(asdict(entry)) + "\n")
+        self.index_file.flush()
+
+        self.index[url] = entry
+
+    def get(self, url: str) -> str:
+        return next(self.read([self.index[url]]))[1]
+
+    # All entries with a URL that starts with the prefix, in the order stored.
+    def entries(self, url_prefix: str = "") -> List[ArchiveEntry]:
+        entries = [e for e in self.index.values() if e.url.startswith(url_prefix)]
+        entries.sort(key=lambda e: e.offset)
+        return entries
+
+    # Get the key and payload of each entry.
+    def read(self, entries: List[ArchiveEntry]) -> Iterator[Tuple[str, str]]:
+        self.data_file.flush()
+        yield from read_entries(self.data_path, entries)
+
+
+# Get the key and payload of each entry from the data file of an archive. This
+# doesn't need the archive open, so other processes can read entries for
+# themselves.
+def read_entries(
+    data_path: str, entries: List[ArchiveEntry]
+) -> Iterator[Tuple[str, str]]:
+    with open(data_path, "rb") as data_file:
+        for entry in entries:
+            data_file.seek(entry.offset)
+            record = data_file.read(entry.length)
+            yield entry.key, zlib.decompress(record).decode("UTF-8")
@@ -0,0 +1,222 @@
+import asyncio
+from datetime import date
+from typing import Any, Dict, FrozenSet, List
+
+import ncaa_basketball.ncaa as ncaa
+from ncaa_basketball.archive import Archive
+from ncaa_basketball.util import client_session
+
+try:
+    import numpy as np
+except ImportError:
+    raise RuntimeError(
+        "The columnar play by play needs the numpy package: pip install numpy"
+    )
+
+# Arrays of Python strings, so nothing is converted on the way to the CSV file.
+Columns = Dict[str, np.ndarray]
+
+# Fields found while parsing each event, taken straight from it.
+event_fields = [
+    "period",
+    "time",
+    "score",
+    "homeText",
+    "visitorText",
+    "eventType",
+    "shotMade",
+    "isHomeEvent",
+    "homePlayer",
+    "visitorPlayer",
+]
+
+# Fields that are the same for every event of a game.
+game_fields = [
+    "gameID",
+    "homeTeamID",
+    "homeTeamName",
+    "visitorTeamID",
+    "visitorTeamName",
+]
+
+# Lineup fields of a team, in the order of a row of the lineup table.
+lineup_fields = ["Player{}".format(i) for i in range(1, ncaa.max_lineup_size + 1)]
+lineup_fields.append("PlayerUID")
+
+known_fields = set(ncaa.pbp_fields)
+
+
+# The lineups of a game, each given a number the events refer to, and their
+# lineup fields in a table with a row for each number.
+class LineupTable:
+    def __init__(self, state: ncaa.GameState):
+        self.state = state
+        self.numbers: Dict[FrozenSet[str], int] = dict()
+        self.rows: List[List[str]] = list()
+
+    def number(self, players: FrozenSet[str]) -> int:
+        if (number := self.numbers.get(players)) is None:
+            ordered_players, uid = ncaa.get_lineup(players, self.state)
+            row = ordered_players[: ncaa.max_lineup_size]
+            row.extend([""] * (ncaa.max_lineup_size - len(row)))
+            row.append(uid)
+
+            number = self.numbers[players] = len(self.rows)
+            self.rows.append(row)
+
+        return number
+
+    # The lineup fields of the events with the given lineup numbers.
+    def columns(self, team: str, numbers: List[int]) -> Columns:
+        table = np.empty((len(self.rows), len(lineup_fields)), dtype=object)
+        table[:] = self.rows
+        values = table[numbers]
+        return {
+            team + name: values[:, index] for index, name in enumerate(lineup_fields)
+        }
+
+
+# Expand a game's play by play into one array per field. The events are parsed
+# one at a time like expand_pbp_data does, but only into the fields above: the
+# lineups, score and time fields and the mirrored events are worked out for the
+# whole game at once, without a row for each event.
+def expand_game_columns(game_id: str, data: Dict[str, Any], mirror: bool) -> Columns:
+    state = ncaa.GameState()
+    lineups = LineupTable(state)
+    events: List[Dict[str, str]] = list()
+    home_lineups: List[int] = list()
+    away_lineups: List[int] = list()
+
+    for period_events in ncaa.split_pbp_data(game_id, data):
+        for event in period_events:
+            ncaa.add_event(event, state, derive=False)
+
+        for event_player in ncaa.take_period_events(state):
+            events.append(event_player.event)
+            home_lineups.append(lineups.number(event_player.active_home_players))
+            away_lineups.append(lineups.number(event_player.active_away_players))
+
+    if not events:
+        return empty_columns()
+
+    # Fields the NCAA added that pbp_fields doesn't know of are kept as well.
+    extra_fields = set().union(*events) - known_fields
+    columns: Columns = dict()
+    for name in event_fields + sorted(extra_fields):
+        columns[name] = object_array([event.get(name, "") for event in events])
+    for name in game_fields:
+        columns[name] = np.full(len(events), events[0].get(name, ""), dtype=object)
+    columns["isMirroredEvent"] = np.full(len(events), "FALSE", dtype=object)
+
+    columns |= lineups.columns("home", home_lineups)
+    columns |= lineups.columns("visitor", away_lineups)
+
+    derive_columns(columns)
+
+    if mirror:
+        return interleave_columns(columns, mirror_columns(columns))
+    return columns
+
+
+# Fill in the score and time fields, like expand_event does for one event.
+def derive_columns(columns: Columns):
+    # Carry the last score forward to the events without one.
+    score = columns["score"]
+    has_score = score != ""
+    last_score = np.maximum.accumulate(np.where(has_score, np.arange(len(score)), -1))
+    score = np.where(last_score >= 0, score[np.maximum(last_score, 0)], "0-0")
+    columns["score"] = score
+
+    # Splitting is done on fixed width strings, then turned back into objects.
+    score_parts = np.char.partition(score.astype(np.str_), "-")
+    columns["homeScore"] = score_parts[:, 0].astype(object)
+    columns["visitorScore"] = score_parts[:, 2].astype(object)
+
+    time_parts = np.char.partition(columns["time"].astype(np.str_), ":")
+    seconds = time_parts[:, 0].astype(int) * 60 + time_parts[:, 2].astype(int)
+    columns["timeSeconds"] = seconds.astype(np.str_).astype(object)
+
+
+# Switch the home and visitor teams, like mirror_event does for one event.
+def mirror_columns(columns: Columns) -> Columns:
+    mirrored: Columns = dict()
+    for name, column in columns.items():
+        if name.startswith("home"):
+            mirrored["visitor" + name.removeprefix("home")] = column
+        elif name.startswith("visitor"):
+            mirrored["home" + name.removeprefix("visitor")] = column
+        else:
+            mirrored[name] = column
+
+    is_home = columns["isHomeEvent"]
+    mirrored["isHomeEvent"] = np.select(
+        [is_home == "TRUE", is_home == "FALSE"], ["FALSE", "TRUE"], is_home
+    )
+    mirrored["isMirroredEvent"] = np.full(len(is_home), "TRUE", dtype=object)
+    return mirrored
+
+
+# Put each mirrored event right after its event, like expand_pbp_data does.
+def interleave_columns(first: Columns, second: Columns) -> Columns:
+    columns: Columns = dict()
+    for name, column in first.items():
+        merged = np.empty(len(column) * 2, dtype=object)
+        merged[0::2] = column
+        merged[1::2] = second[name]
+        columns[name] = merged
+
+    return columns
+
+
+def object_array(values: List[str]) -> np.ndarray:
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+def empty_columns() -> Columns:
+    return {name: np.empty(0, dtype=object) for name in ncaa.pbp_fields}
+
+
+# Join the columns of many games, as lists for the CSV writer, which goes
+# through them faster than through arrays. Games without a field get empty
+# values for it.
+def concat_columns(games_columns: List[Columns]) -> Dict[str, List[str]]:
+    if not games_columns:
+        games_columns = [empty_columns()]
+
+    names = ncaa.pbp_fields + sorted(
+        set().union(*games_columns).difference(ncaa.pbp_fields)
+    )
+    return {
+        name: np.concatenate(
+            [
+                columns.get(name, np.full(len(columns["gameID"]), "", dtype=object))
+                for columns in games_columns
+            ]
+        ).tolist()
+        for name in names
+    }
+
+
+async def get_games_pbp_columns(
+    division: str,
+    start_date: date,
+    end_date: date,
+    mirror: bool,
+    archive: Archive | None = None,
+) -> Dict[str, List[str]]:
+    games_columns: List[Columns] = list()
+
+    async def gather_game_data(game: str):
+        data = await ncaa.get_game_pbp(session, game, archive)
+        games_columns.append(expand_game_columns(game, data, mirror))
+
+    async with client_session() as session:
+        games = await ncaa.get_game_list(session, division, start_date, end_date)
+
+        # Run all game gathering tasks at the same time.
+        tasks = [gather_game_data(game) for game in games]
+        await asyncio.gather(*tasks)
+
+    return concat_columns(games_columns)
@@ -0,0 +1,138 @@
+import gzip
+import io
+import queue
+import threading
+from typing import BinaryIO, Callable, Dict, Optional, TextIO
+
+compression_suffixes = {
+    ".gz": "gzip",
+    ".zst": "zstd",
+}
+
+gzip_magic = b"\x1f\x8b"
+zstd_magic = b"\x28\xb5\x2f\xfd"
+
+# Size of the chunks handed to the compression thread.
+chunk_size = 1 << 20
+
+
+def compression_for_path(path: str) -> Optional[str]:
+    for suffix, compression in compression_suffixes.items():
+        if path.endswith(suffix):
+            return compression
+
+    return None
+
+
+# Add the suffix for a compression to a file name, if it doesn't have it yet.
+def add_suffix(path: str, compression: Optional[str]) -> str:
+    for suffix, name in compression_suffixes.items():
+        if name == compression and not path.endswith(suffix):
+            return path + suffix
+
+    return path
+
+
+def import_zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError(
+            "zstd compression needs the zstandard package: pip install zstandard"
+        )
+
+    return zstandard
+
+
+def gzip_writer(fileobj: BinaryIO) -> BinaryIO:
+    return gzip.GzipFile(fileobj=fileobj, mode="wb")  # type: ignore[return-value]
+
+
+def zstd_writer(fileobj: BinaryIO) -> BinaryIO:
+    zstandard = import_zstandard()
+    # Negative threads uses one compression thread per core.
+    return zstandard.ZstdCompressor(threads=-1).stream_writer(fileobj)
+
+
+compressors: Dict[str, Callable[[BinaryIO], BinaryIO]] = {
+    "gzip": gzip_writer,
+    "zstd": zstd_writer,
+}
+
+
+# A write only file that hands chunks to a thread which compresses them and
+# writes them out, so compressing does not hold up the caller.
+class BackgroundCompressor(io.RawIOBase):
+    def __init__(self, path: str, compression: str):
+        self.file = open(path, "wb")
+        self.compressor = compressors[compression](self.file)
+        self.chunks: queue.Queue[bytes | None] = queue.Queue(maxsize=16)
+        self.error: Exception | None = None
+        self.thread = threading.Thread(target=self.compress, daemon=True)
+        self.thread.start()
+
+    def compress(self):
+        while (chunk := self.chunks.get()) is not None:
+            # After a failure keep draining, so the writer never blocks.
+            if self.error:
+                continue
+            try:
+                self.compressor.write(chunk)
+            except Exception as e:
+                self.error = e
+
+        try:
+            if not self.error:
+                self.compressor.close()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.file.close()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        if self.error:
+            raise self.error
+        data = bytes(b)
+        self.chunks.put(data)
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self.chunks.put(None)
+            self.thread.join()
+        super().close()
+        if self.error:
+            raise self.error
+
+
+# Open a text file for writing, compressing it if asked to or if the file name
+# ends with a compression suffix.
+def open_output(path: str, compression: Optional[str] = None) -> TextIO:
+    compression = compression or compression_for_path(path)
+    if not compression:
+        return open(path, "w", newline="", encoding="UTF-8")
+
+    if compression not in compressors:
+        raise ValueError("Unknown compression: {}".format(compression))
+
+    raw = io.BufferedWriter(BackgroundCompressor(path, compression), chunk_size)
+    return io.TextIOWrapper(raw, newline="", encoding="UTF-8")
+
+
+# Open a text file for reading, decompressing it if needed.
+def open_input(path: str) -> TextIO:
+    with open(path, "rb") as file:
+        magic = file.read(4)
+
+    if magic.startswith(gzip_magic):
+        return gzip.open(path, "rt", newline="", encoding="UTF-8")
+
+    if magic.startswith(zstd_magic):
+        zstandard = import_zstandard()
+        reader = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"))
+        return io.TextIOWrapper(reader, newline="", encoding="UTF-8")
+
+    return open(path, "r", newline="", encoding="UTF-8")
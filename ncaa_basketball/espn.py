@@ -1,13 +1,15 @@
 import asyncio
 import json
 import re
+from dataclasses import dataclass, field
 from datetime import date, timedelta
-from typing import Any, Dict, Iterator, List, Set, Tuple
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Set, Tuple
 
-import aiohttp
-from bs4 import BeautifulSoup
+from ncaa_basketball.archive import Archive
+from ncaa_basketball.util import client_session, get_url, shared_fetches
 
-from ncaa_basketball.util import get_url
+if TYPE_CHECKING:
+    import aiohttp
 
 # Group 50 is Division I.
 teamlist_url = "https://www.espn.com/mens-college-basketball/teams/_/group/50"
@@ -26,8 +28,94 @@ script_regex = re.compile(r"window\['__espnfitt__'\]=({.+?});")
 multi_stat_re = re.compile(r"[^\s\d]+-[^\s\d]+")
 
 
+# Season label used by ESPN for the career totals row.
+career_season = "Career"
+
+# Season label for the newest season of each player, with the current season
+# projection. Which season that is goes in the "current season" field.
+current_season_label = "Current"
+
+game_fields = [
+    "GameID",
+    "GameTitle",
+    "Game Date",
+    "hometeam Name",
+    "hometeam ID",
+    "awayteam Name",
+    "awayteam ID",
+]
+
+player_fields = [
+    "player ID",
+    "full name",
+    "first name",
+    "last name",
+    "display number",
+    "position",
+    "class",
+    "status",
+    "team name",
+    "team ID",
+    "height",
+    "weight",
+    "birthplace",
+]
+
+
+# Stat field names found on ESPN's pages, in the order of the first page that
+# has them. The parsers add the name of each stat field they write, so the
+# schema comes from ESPN's own stat tables, read by the same code that writes
+# the stats, rather than from a list of ESPN's labels kept by hand.
+class StatLayout:
+    def __init__(self):
+        # Used as an ordered set.
+        self.names: Dict[str, None] = dict()
+
+    def add(self, name: str):
+        self.names.setdefault(name)
+
+    def stat_names(self) -> List[str]:
+        return list(self.names)
+
+
+# Which parts of the player stats to keep. Empty lists mean "everything".
+@dataclass
+class StatProjection:
+    groups: List[str] = field(default_factory=list)
+    stats: List[str] = field(default_factory=list)
+    seasons: List[str] = field(default_factory=list)
+    current_season_only: bool = False
+    career: bool = True
+
+    # Seasons to label the stat columns with, or none for all of them.
+    def season_labels(self) -> List[str]:
+        if self.current_season_only:
+            return [current_season_label]
+        return self.seasons
+
+
+# Get the data of a page. If an archive is given, the raw data is saved to it
+# under the key. The data may be shared with other callers, so don't change it.
+async def get_data(
+    session: "aiohttp.ClientSession",
+    url: str,
+    archive: Archive | None = None,
+    key: str = "",
+) -> Dict[str, Any]:
+    data, raw_data = await shared_fetches.get(url, lambda: fetch_data(session, url))
+    if archive and raw_data:
+        archive.put(url, key, raw_data)
+
+    return data
+
+
 # Download the page, and load the data as a HTML document.
-async def get_data(session: aiohttp.ClientSession, url: str) -> Dict[str, Any]:
+async def fetch_data(
+    session: "aiohttp.ClientSession", url: str
+) -> Tuple[Dict[str, Any], str]:
+    # Slow to import, and only needed once there is a page.
+    from bs4 import BeautifulSoup
+
     page = await get_url(session, url)
     document = BeautifulSoup(page, "html.parser")
 
@@ -37,15 +125,15 @@ async def get_data(session: aiohttp.ClientSession, url: str) -> Dict[str, Any]:
         if capture := script_regex.search(script.text):
             data = capture.group(1)
             # Convert the text of the page into a data format Python understands.
-            return json.loads(data)
+            return json.loads(data), data
 
     print("WARNING: found no data for URL {}".format(url))
-    return dict()
+    return dict(), ""
 
 
 # Get all game IDs between the two dates, inclusive.
 async def get_game_list(
-    session: aiohttp.ClientSession, start_date: date, end_date: date
+    session: "aiohttp.ClientSession", start_date: date, end_date: date
 ) -> Set[str]:
     games: Set[str] = set()
 
@@ -65,8 +153,20 @@ async def get_game_list(
 
 
 # Get all game data for the given ID.
-async def get_game_data(session: aiohttp.ClientSession, game_id: str) -> Dict[str, str]:
-    raw_data = (await get_data(session, gamestats_url.format(game_id)))["page"]
+async def get_game_data(
+    session: "aiohttp.ClientSession",
+    game_id: str,
+    archive: Archive | None = None,
+    layout: StatLayout | None = None,
+) -> Dict[str, str]:
+    raw_data = await get_data(session, gamestats_url.format(game_id), archive, game_id)
+    return parse_game_data(game_id, raw_data, layout)
+
+
+def parse_game_data(
+    game_id: str, raw_data: Dict[str, Any], layout: StatLayout | None = None
+) -> Dict[str, str]:
+    raw_data = raw_data["page"]
     game_data: Dict[str, str] = dict()
     game_data["GameID"] = game_id
 
@@ -87,13 +187,10 @@ async def get_game_data(session: aiohttp.ClientSession, game_id: str) -> Dict[st
 
     for team in ["home", "away"]:
         for stat in team_stats[team]["s"].values():
-            # If this is a compound stat (like shots made with shots attempted),
-            # break it out into different fields.
-            if "-" in stat["n"]:
-                for n, d in zip(stat["n"].split("-"), stat["d"].split("-")):
-                    game_data["{}team {}".format(team, n)] = d
-            else:
-                game_data["{}team {}".format(team, stat["l"])] = stat["d"]
+            for name, value in split_team_stat(stat):
+                game_data["{}team {}".format(team, name)] = value
+                if layout:
+                    layout.add(name)
 
     for team_data in metadata["tms"]:
         if team_data["isHome"]:
@@ -104,13 +201,39 @@ async def get_game_data(session: aiohttp.ClientSession, game_id: str) -> Dict[st
     return game_data
 
 
-async def get_games_data(start_date: date, end_date: date) -> List[Dict[str, str]]:
+# Get the field names and values of a team stat on the matchup page. If this
+# is a compound stat (like shots made with shots attempted), break it out into
+# different fields.
+def split_team_stat(stat: Dict[str, str]) -> Iterator[Tuple[str, str]]:
+    if "-" in stat["n"]:
+        return zip(stat["n"].split("-"), stat["d"].split("-"))
+
+    return zip([stat["l"]], [stat["d"]])
+
+
+# Output columns of get_game_data, in order, with the stat names of the layout
+# the games were parsed into.
+def game_fieldnames(stat_names: List[str]) -> List[str]:
+    fieldnames = game_fields.copy()
+    for team in ["home", "away"]:
+        fieldnames.extend(f"{team}team {stat}" for stat in stat_names)
+        fieldnames.append(f"{team}team Score")
+
+    return fieldnames
+
+
+async def get_games_data(
+    start_date: date,
+    end_date: date,
+    archive: Archive | None = None,
+    layout: StatLayout | None = None,
+) -> List[Dict[str, str]]:
     games_data: List[Dict[str, str]] = list()
 
     async def gather_game_data(game: str):
-        games_data.append(await get_game_data(session, game))
+        games_data.append(await get_game_data(session, game, archive, layout))
 
-    async with aiohttp.ClientSession() as session:
+    async with client_session() as session:
         games = await get_game_list(session, start_date, end_date)
 
         # Run all game gathering tasks at the same time.
@@ -120,28 +243,54 @@ async def get_games_data(start_date: date, end_date: date) -> List[Dict[str, str
     return games_data
 
 
-def split_stat(key: str, value: str) -> Iterator[Tuple[str, str]]:
-    if multi_stat := multi_stat_re.search(key):
-        full_stats: List[str] = list()
+# Get the field names a stat is written to. A compound stat (like shots made
+# with shots attempted) is broken out into one field per part.
+def stat_keys(key: str) -> List[str]:
+    # Percentages can be derived from other fields.
+    if "Percentage" in key:
+        return []
+
+    if "-" not in key:
+        return [key]
 
+    if multi_stat := multi_stat_re.search(key):
         sub_stats = multi_stat.group().split("-")
-        for stat in sub_stats:
-            full_stats.append(key.replace(multi_stat.group(), stat))
+        return [key.replace(multi_stat.group(), stat) for stat in sub_stats]
+
+    return []
 
-        return zip(full_stats, value.split("-"))
 
-    return iter(())
+def split_stat(key: str, value: str) -> Iterator[Tuple[str, str]]:
+    keys = stat_keys(key)
+    if len(keys) > 1:
+        return zip(keys, value.split("-"))
+
+    return zip(keys, [value])
 
 
 async def get_player_data(
-    session: aiohttp.ClientSession | None, player_id: str, group_filter: List[str] = []
+    session: "aiohttp.ClientSession | None",
+    player_id: str,
+    projection: StatProjection = StatProjection(),
+    archive: Archive | None = None,
+    layout: StatLayout | None = None,
 ) -> Dict[str, str]:
+    url = playerstats_url.format(player_id)
     if not session:
-        async with aiohttp.ClientSession() as session:
-            raw_data = await get_data(session, playerstats_url.format(player_id))
+        async with client_session() as session:
+            raw_data = await get_data(session, url, archive, player_id)
     else:
-        raw_data = await get_data(session, playerstats_url.format(player_id))
+        raw_data = await get_data(session, url, archive, player_id)
 
+    return parse_player_data(player_id, raw_data, projection, layout)
+
+
+def parse_player_data(
+    player_id: str,
+    raw_data: Dict[str, Any],
+    projection: StatProjection = StatProjection(),
+    layout: StatLayout | None = None,
+) -> Dict[str, str]:
     player_data: Dict[str, str] = dict()
 
     player_data["player ID"] = player_id
@@ -165,37 +314,70 @@ async def get_player_data(
 
     for group in player_stats["tbl"]:
         prefix = group["ttl"]
-        if group_filter and prefix not in group_filter:
+        if projection.groups and prefix not in projection.groups:
             continue
 
-        rows = group["row"] + [group["car"]]
+        # Drop unwanted rows before expanding them into columns.
+        rows = [
+            (row[0], row)
+            for row in group["row"]
+            if not projection.seasons or row[0] in projection.seasons
+        ]
+        if projection.current_season_only and rows:
+            # A new season has no row until its first game, so use the newest
+            # season the player has played in rather than the calendar.
+            season, row = max(rows, key=lambda season_row: season_row[0])
+            player_data["current season"] = season
+            rows = [(current_season_label, row)]
+        if projection.career and "car" in group:
+            rows.append((career_season, group["car"]))
+        if not rows:
+            continue
 
         for index, column in enumerate(group["col"]):
             # First two entries are Season and Team, not stats.
             if index < 2:
                 continue
 
-            key = f"{prefix} {column['ttl']}"
-
-            # Percentages can be derived from other fields.
-            if "Percentage" in key:
+            if projection.stats and column["ttl"] not in projection.stats:
                 continue
 
-            for row in rows:
-                season = row[0]
+            key = f"{prefix} {column['ttl']}"
+            if not (keys := stat_keys(key)):
+                continue
+            if layout:
+                for sub_key in keys:
+                    layout.add(sub_key)
 
-                # If this is a compound stat (like shots made with shots attempted),
-                # break it out into different fields.
-                if "-" in key:
-                    for sub_key, value in split_stat(key, row[index]):
-                        player_data[f"{sub_key} {season}"] = value
-                else:
-                    player_data[f"{key} {season}"] = row[index]
+            for season, row in rows:
+                for sub_key, value in split_stat(key, row[index]):
+                    player_data[f"{sub_key} {season}"] = value
 
     return player_data
 
 
-async def get_team_list(session: aiohttp.ClientSession) -> Dict[str, Dict[str, str]]:
+# Output columns of get_player_data, in order, with the stat names of the
+# layout the players were parsed into. Seasons differ between players, so this
+# is only known when the projection limits them.
+def player_fieldnames(
+    projection: StatProjection, stat_names: List[str]
+) -> List[str] | None:
+    seasons = projection.season_labels()
+    if not seasons:
+        return None
+    if projection.career:
+        seasons = seasons + [career_season]
+
+    fieldnames = player_fields.copy()
+    if projection.current_season_only:
+        fieldnames.append("current season")
+    for sub_key in stat_names:
+        fieldnames.extend(f"{sub_key} {season}" for season in seasons)
+
+    return fieldnames
+
+
+async def get_team_list(session: "aiohttp.ClientSession") -> Dict[str, Dict[str, str]]:
     teams: Dict[str, Dict[str, str]] = dict()
 
     data = await get_data(session, teamlist_url)
@@ -215,7 +397,7 @@ async def get_team_list(session: aiohttp.ClientSession) -> Dict[str, Dict[str, s
     return teams
 
 
-async def get_player_list(session: aiohttp.ClientSession, team: str) -> List[str]:
+async def get_player_list(session: "aiohttp.ClientSession", team: str) -> List[str]:
     players: List[str] = list()
 
     data = await get_data(session, playerlist_url.format(team))
@@ -231,16 +413,22 @@ async def get_player_list(session: aiohttp.ClientSession, team: str) -> List[str
     return players
 
 
-async def get_league_players_data(group_filter: List[str] = []) -> List[Dict[str, str]]:
+async def get_league_players_data(
+    projection: StatProjection = StatProjection(),
+    archive: Archive | None = None,
+    layout: StatLayout | None = None,
+) -> List[Dict[str, str]]:
     players_data: List[Dict[str, str]] = list()
 
     async def gather_player_list(team: str):
         players.extend(await get_player_list(session, team))
 
     async def gather_player_data(player: str):
-        players_data.append(await get_player_data(session, player, group_filter))
+        players_data.append(
+            await get_player_data(session, player, projection, archive, layout)
+        )
 
-    async with aiohttp.ClientSession() as session:
+    async with client_session() as session:
         teams = await get_team_list(session)
 
         players: List[str] = list()
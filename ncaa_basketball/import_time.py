@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from typing import List, Set, Tuple
+
+# How long each start point may take to import, in milliseconds. Most of it is
+# asyncio and argparse, which every command needs.
+budgets = {
+    "ncaa_basketball.matchup": 250,
+    "ncaa_basketball.player": 250,
+    "ncaa_basketball.play_by_play": 250,
+    "ncaa_basketball.reprocess": 300,
+    "ncaa_basketball.live": 300,
+    "ncaa_basketball.joined_games": 300,
+    "ncaa_basketball.scraper_gui": 250,
+}
+
+# Modules that are slow to import, and must only be imported once needed.
+lazy_modules = ["aiohttp", "bs4", "numpy", "zstandard"]
+
+
+# Import the module in a new interpreter, and give how long it took in
+# milliseconds and the names of all the modules it imported.
+def measure_import(module: str) -> Tuple[float, Set[str]]:
+    package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [package_dir, env.get("PYTHONPATH")])
+    )
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode:
+        raise RuntimeError(
+            "Importing {} failed:\n{}".format(module, result.stderr.strip())
+        )
+
+    cumulative = 0.0
+    imported: Set[str] = set()
+    # Lines look like: "import time:  self [us] | cumulative |   name".
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, total, name = line.removeprefix("import time:").split("|")
+        if not total.strip().isdigit():
+            continue  # The header
+        imported.add(name.strip())
+        if name.strip() == module:
+            cumulative = int(total) / 1000
+
+    return cumulative, imported
+
+
+# Check each start point against its budget, and give the problems found.
+def check_imports(runs: int, scale: float) -> List[str]:
+    problems = list()
+
+    for module, budget in budgets.items():
+        times = list()
+        try:
+            for _ in range(runs):
+                import_time, imported = measure_import(module)
+                times.append(import_time)
+        except RuntimeError as e:
+            problems.append(str(e))
+            continue
+
+        import_time = statistics.median(times)
+        limit = budget * scale
+        print(
+            "{:<32} {:>8.1f} ms (budget {:.0f} ms)".format(module, import_time, limit)
+        )
+
+        if import_time > limit:
+            problems.append(
+                "{} took {:.1f} ms to import, over its {:.0f} ms budget".format(
+                    module, import_time, limit
+                )
+            )
+        for lazy_module in lazy_modules:
+            if lazy_module in imported:
+                problems.append("{} imports {} right away".format(module, lazy_module))
+
+    return problems
+
+
+# Command line start point
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check that the commands still start quickly, "
+        "using python -X importtime."
+    )
+
+    parser.add_argument(
+        "--runs",
+        type=int,
+        default=5,
+        help="Times to import each module. The median time is used.",
+    )
+    parser.add_argument(
+        "--scale",
+        type=float,
+        default=1.0,
+        help="Multiply the budgets by this, for slower machines.",
+    )
+
+    args = parser.parse_args()
+
+    problems = check_imports(args.runs, args.scale)
+    for problem in problems:
+        print("FAILED: {}".format(problem))
+
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
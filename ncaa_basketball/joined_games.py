@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+
+import argparse
+import asyncio
+from datetime import date, timedelta
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set, Tuple
+
+import ncaa_basketball.espn as espn
+import ncaa_basketball.ncaa as ncaa
+import ncaa_basketball.util as util
+from ncaa_basketball.archive import Archive
+from ncaa_basketball.compression import add_suffix
+from ncaa_basketball.profiling import add_profile_argument, profile
+from ncaa_basketball.team_mapping import GameTeams, TeamMapping, ncaa_teams
+
+if TYPE_CHECKING:
+    import aiohttp
+
+# Play by play totals of each team, after the ESPN box score.
+pbp_count_fields = [
+    *(f"pbp {event_type}" for event_type in ncaa.event_types),
+    "pbp Shots Made",
+    "pbp Shots Missed",
+]
+pbp_total_fields = pbp_count_fields + ["pbp Lineups", "pbp Score"]
+
+ncaa_fields = ["NCAA GameID", "hometeam NCAA ID", "awayteam NCAA ID"]
+
+
+# Output columns of get_joined_games, in order, with the ESPN stat names of the
+# layout the games were parsed into.
+def joined_fieldnames(stat_names: List[str]) -> List[str]:
+    fieldnames = espn.game_fieldnames(stat_names) + ncaa_fields
+    for team in ["home", "away"]:
+        fieldnames.extend(f"{team}team {field}" for field in pbp_total_fields)
+
+    return fieldnames
+
+
+# Add up the play by play of a game for each team, keyed by "home" and
+# "visitor" like the play by play is.
+def get_pbp_totals(rows: List[Dict[str, str]]) -> Dict[str, Dict[str, str]]:
+    totals: Dict[str, Dict[str, int]] = dict()
+    lineups: Dict[str, Set[str]] = dict()
+    for team in ["home", "visitor"]:
+        totals[team] = {field: 0 for field in pbp_count_fields}
+        lineups[team] = set()
+
+    for row in rows:
+        for lineup_team in ["home", "visitor"]:
+            # Skip events from before any players of the team are known.
+            if row.get(f"{lineup_team}Player1"):
+                lineups[lineup_team].add(row[f"{lineup_team}PlayerUID"])
+
+        # Events without text belong to neither team.
+        if row.get("isHomeEvent") == "TRUE":
+            team_counts = totals["home"]
+        elif row.get("isHomeEvent") == "FALSE":
+            team_counts = totals["visitor"]
+        else:
+            continue
+
+        # Leave out event types without a total, like the empty type of
+        # unknown events.
+        if (field := f"pbp {row.get('eventType')}") in team_counts:
+            team_counts[field] += 1
+        if row.get("shotMade") == "TRUE":
+            team_counts["pbp Shots Made"] += 1
+        elif row.get("shotMade") == "FALSE":
+            team_counts["pbp Shots Missed"] += 1
+
+    last_row = rows[-1] if rows else {}
+    team_totals: Dict[str, Dict[str, str]] = dict()
+    for team in ["home", "visitor"]:
+        team_totals[team] = {field: str(value) for field, value in totals[team].items()}
+        team_totals[team]["pbp Lineups"] = str(len(lineups[team]))
+        team_totals[team]["pbp Score"] = last_row.get(f"{team}Score", "")
+
+    return team_totals
+
+
+# ESPN and NCAA data of one day: ESPN game rows, and the NCAA game IDs with
+# their play by play.
+DayData = Tuple[List[Dict[str, str]], List[Tuple[str, Dict[str, Any]]]]
+
+
+# Get both sources for one day at the same time.
+async def get_day_data(
+    session: "aiohttp.ClientSession",
+    division: str,
+    day: date,
+    archive: Archive | None = None,
+    layout: espn.StatLayout | None = None,
+) -> DayData:
+    espn_ids, ncaa_games = await asyncio.gather(
+        espn.get_game_list(session, day, day),
+        ncaa.get_day_games(session, division, day),
+    )
+    ncaa_ids = [ncaa.get_game_id(game) for game in ncaa_games]
+
+    espn_games, ncaa_pbp = await asyncio.gather(
+        asyncio.gather(
+            *(espn.get_game_data(session, game, archive, layout) for game in espn_ids)
+        ),
+        asyncio.gather(
+            *(ncaa.get_game_pbp(session, game, archive) for game in ncaa_ids)
+        ),
+    )
+
+    return list(espn_games), list(zip(ncaa_ids, ncaa_pbp))
+
+
+# Join the box scores and the play by play of the day's games. ESPN games
+# without a match are kept, without the NCAA fields.
+def join_day(day_data: DayData, mapping: TeamMapping) -> List[Dict[str, str]]:
+    espn_rows, ncaa_pbp = day_data
+
+    espn_games: Dict[str, GameTeams] = dict()
+    for row in espn_rows:
+        if "hometeam ID" in row:
+            espn_games[row["GameID"]] = GameTeams(
+                row["GameID"],
+                row["hometeam ID"],
+                row["hometeam Name"],
+                row.get("hometeam Score") or "",
+                row["awayteam ID"],
+                row["awayteam Name"],
+                row.get("awayteam Score") or "",
+            )
+
+    ncaa_games: Dict[str, GameTeams] = dict()
+    ncaa_totals: Dict[str, Dict[str, Dict[str, str]]] = dict()
+    for game_id, data in ncaa_pbp:
+        rows = ncaa.expand_game_pbp(game_id, data, mirror=False)
+        if not rows or "homeTeamID" not in rows[0]:
+            continue
+
+        totals = get_pbp_totals(rows)
+        ncaa_totals[game_id] = totals
+        ncaa_games[game_id] = GameTeams(
+            game_id,
+            rows[0]["homeTeamID"],
+            rows[0]["homeTeamName"],
+            totals["home"]["pbp Score"],
+            rows[0]["visitorTeamID"],
+            rows[0]["visitorTeamName"],
+            totals["visitor"]["pbp Score"],
+        )
+
+    matches = mapping.match_games(list(espn_games.values()), list(ncaa_games.values()))
+    matched = {
+        espn_game.game_id: (ncaa_game, swapped)
+        for espn_game, ncaa_game, swapped in matches
+    }
+
+    if unmatched := len(ncaa_games) - len(matches):
+        print("WARNING: {} NCAA games without an ESPN game".format(unmatched))
+
+    joined_rows: List[Dict[str, str]] = list()
+    for row in espn_rows:
+        if match := matched.get(row["GameID"]):
+            ncaa_game, swapped = match
+            totals = ncaa_totals[ncaa_game.game_id]
+            home, away = ("visitor", "home") if swapped else ("home", "visitor")
+            ncaa_home, ncaa_away = ncaa_teams(ncaa_game, swapped)
+
+            row = row.copy()
+            row["NCAA GameID"] = ncaa_game.game_id
+            row["hometeam NCAA ID"] = ncaa_home[0]
+            row["awayteam NCAA ID"] = ncaa_away[0]
+            for field, value in totals[home].items():
+                row[f"hometeam {field}"] = value
+            for field, value in totals[away].items():
+                row[f"awayteam {field}"] = value
+        else:
+            print("WARNING: no NCAA game for ESPN game {}".format(row["GameID"]))
+
+        joined_rows.append(row)
+
+    return joined_rows
+
+
+async def get_joined_games(
+    division: str,
+    start_date: date,
+    end_date: date,
+    mapping: TeamMapping,
+    archive: Archive | None = None,
+    layout: espn.StatLayout | None = None,
+) -> List[Dict[str, str]]:
+    days = [
+        start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)
+    ]
+
+    async with util.client_session() as session:
+        # Run all days at the same time.
+        days_data = await asyncio.gather(
+            *(get_day_data(session, division, day, archive, layout) for day in days)
+        )
+
+    joined_rows: List[Dict[str, str]] = list()
+    for day_data in days_data:
+        joined_rows.extend(join_day(day_data, mapping))
+
+    return joined_rows
+
+
+def compile_data(
+    division: str,
+    start_date: date,
+    end_date: date,
+    output_path: str,
+    mapping_path: str,
+    compression: Optional[str] = None,
+    archive_path: Optional[str] = None,
+):
+    layout = espn.StatLayout()
+    with (
+        util.open_archive(archive_path) as archive,
+        TeamMapping(mapping_path) as mapping,
+    ):
+        games_data = asyncio.run(
+            get_joined_games(division, start_date, end_date, mapping, archive, layout)
+        )
+
+    fieldnames = joined_fieldnames(layout.stat_names())
+    util.write_data_to_csv(games_data, output_path, fieldnames, compression)
+
+
+# Command line start point
+def main():
+    parser = argparse.ArgumentParser(
+        description="Fetch ESPN game stats and NCAA play by play for the same "
+        "games, and write them joined together to a CSV file."
+    )
+
+    parser.add_argument(
+        "start_date",
+        type=str,
+        help="First date to fetch games from, in any ISO format. Eg: 2023-01-16.",
+    )
+    parser.add_argument(
+        "end_date",
+        type=str,
+        help="Last date to fetch games from, inclusive.",
+    )
+    parser.add_argument(
+        "--division",
+        type=str,
+        default="d1",
+        help="NCAA division to lookup games in. ESPN only has Division I.",
+    )
+    parser.add_argument(
+        "--mapping",
+        type=str,
+        default="team_mapping.json",
+        help="JSON file of the ESPN and NCAA IDs of each team. Teams not in it "
+        "yet are matched by name, and added to it.",
+    )
+    parser.add_argument(
+        "--compress",
+        choices=["gzip", "zstd"],
+        help="Compress the output file.",
+    )
+    parser.add_argument(
+        "--archive",
+        type=str,
+        help="Directory to save the raw downloaded data in, for the reprocess command.",
+    )
+
+    add_profile_argument(parser)
+
+    args = parser.parse_args()
+
+    with profile(args.profile):
+        compile_data(
+            args.division,
+            date.fromisoformat(args.start_date),
+            date.fromisoformat(args.end_date),
+            add_suffix("joined_games.csv", args.compress),
+            args.mapping,
+            args.compress,
+            args.archive,
+        )
+
+
+if __name__ == "__main__":
+    main()
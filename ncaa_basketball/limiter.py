@@ -0,0 +1,181 @@
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, List, Tuple
+
+
+@dataclass
+class LimiterMetrics:
+    limit: int
+    in_flight: int
+    requests: int
+    errors: int
+    increases: int
+    decreases: int
+    latency: float
+    baseline_latency: float
+
+
+# Limits how many requests run at once, and finds the highest limit the server
+# keeps up with (additive increase, multiplicative decrease). While responses
+# come back quickly the limit grows by about one per round of requests. Errors
+# like 5xx, 429 and timeouts cut it down right away. Latency cuts it down too,
+# once it stays well above what it usually is when the server is not busy.
+class AdaptiveLimiter:
+    def __init__(
+        self,
+        initial: int = 8,
+        minimum: int = 1,
+        maximum: int = 100,
+        latency_tolerance: float = 2.0,
+        decrease_factor: float = 0.5,
+        baseline_window: float = 60.0,
+        sample_size: int = 20,
+        breaches_to_decrease: int = 3,
+    ):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_tolerance = latency_tolerance
+        self.decrease_factor = decrease_factor
+        self.baseline_window = baseline_window
+        self.sample_size = sample_size
+        self.breaches_to_decrease = breaches_to_decrease
+
+        self.in_flight = 0
+        self.waiters: Deque[asyncio.Future] = deque()
+
+        # Latencies are compared a sample of requests at a time, by their
+        # median, so one slow page doesn't count for much. The baseline is a
+        # low percentile of the sample medians in the baseline window. All are
+        # in seconds.
+        self.sample: List[float] = list()
+        self.latency = 0.0
+        self.baseline_latency = 0.0
+        self.sample_medians: Deque[Tuple[float, float]] = deque()
+        # Samples in a row with a median too far above the baseline.
+        self.breaches = 0
+        self.last_decrease = 0.0
+
+        self.requests = 0
+        self.errors = 0
+        self.increases = 0
+        self.decreases = 0
+        # Recent changes to the limit: (time, reason, new limit).
+        self.decisions: Deque[Tuple[float, str, int]] = deque(maxlen=1000)
+
+    async def __aenter__(self):
+        while self.in_flight >= int(self.limit):
+            waiter = asyncio.get_running_loop().create_future()
+            self.waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                # If we were woken up, hand the free slot to someone else.
+                if waiter.done() and not waiter.cancelled():
+                    self.wake_waiters()
+                raise
+            finally:
+                if waiter in self.waiters:
+                    self.waiters.remove(waiter)
+
+        self.in_flight += 1
+
+    async def __aexit__(self, *args):
+        self.in_flight -= 1
+        self.wake_waiters()
+
+    def wake_waiters(self):
+        free = int(self.limit) - self.in_flight
+        while free > 0 and self.waiters:
+            waiter = self.waiters.popleft()
+            # Skip waiters that were cancelled, or left over from a finished run.
+            if waiter.done() or waiter.get_loop().is_closed():
+                continue
+            waiter.set_result(None)
+            free -= 1
+
+    def record_success(self, latency: float):
+        self.requests += 1
+        now = time.monotonic()
+
+        # Requests sent before the last back off say nothing about the limit
+        # since then.
+        if now - latency < self.last_decrease:
+            return
+
+        self.sample.append(latency)
+        if len(self.sample) >= self.sample_size:
+            self.finish_sample(now)
+
+            if self.breaches >= self.breaches_to_decrease:
+                self.last_decrease = now
+                self.breaches = 0
+                self.set_limit(self.limit * self.decrease_factor, "latency")
+                return
+
+        if not self.breaches:
+            self.set_limit(self.limit + 1 / self.limit, "healthy")
+            self.wake_waiters()
+
+    # Compare the median of the sample with the baseline, then add it to the
+    # baseline. If the server gets slower for good, the baseline follows once
+    # the faster samples leave the window.
+    def finish_sample(self, now: float):
+        self.sample.sort()
+        self.latency = self.sample[len(self.sample) // 2]
+        self.sample = list()
+
+        if not self.baseline_latency:
+            pass
+        elif self.latency > self.baseline_latency * self.latency_tolerance:
+            self.breaches += 1
+        else:
+            self.breaches = 0
+
+        medians = self.sample_medians
+        medians.append((now, self.latency))
+        while medians[0][0] < now - self.baseline_window:
+            medians.popleft()
+
+        ordered = sorted(median for _, median in medians)
+        self.baseline_latency = ordered[len(ordered) // 10]
+
+    def record_failure(self, reason: str):
+        self.requests += 1
+        self.errors += 1
+
+        # Requests that were already running when we backed off will fail too.
+        # Only back off once for them, not once for each.
+        now = time.monotonic()
+        if now - self.last_decrease < max(self.latency, 0.1):
+            return
+        self.last_decrease = now
+        self.breaches = 0
+
+        self.set_limit(self.limit * self.decrease_factor, reason)
+
+    def set_limit(self, limit: float, reason: str):
+        old_limit = int(self.limit)
+        self.limit = min(max(limit, self.minimum), self.maximum)
+
+        if int(self.limit) > old_limit:
+            self.increases += 1
+        elif int(self.limit) < old_limit:
+            self.decreases += 1
+        else:
+            return
+        self.decisions.append((time.time(), reason, int(self.limit)))
+
+    def metrics(self) -> LimiterMetrics:
+        return LimiterMetrics(
+            limit=int(self.limit),
+            in_flight=self.in_flight,
+            requests=self.requests,
+            errors=self.errors,
+            increases=self.increases,
+            decreases=self.decreases,
+            latency=self.latency,
+            baseline_latency=self.baseline_latency,
+        )
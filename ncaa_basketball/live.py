@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+
+import argparse
+import asyncio
+import json
+from typing import Dict, List, Optional, Set
+
+import ncaa_basketball.ncaa as ncaa
+import ncaa_basketball.util as util
+
+
+# Send each new row as a line of JSON to everyone connected to the port.
+class RowBroadcaster:
+    def __init__(self):
+        self.clients: Set[asyncio.StreamWriter] = set()
+        self.server: Optional[asyncio.Server] = None
+
+    async def start(self, port: int):
+        self.server = await asyncio.start_server(self.connect, "127.0.0.1", port)
+
+    async def close(self):
+        for writer in self.clients:
+            writer.close()
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+
+    async def connect(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.clients.add(writer)
+        try:
+            await reader.read()
+        finally:
+            self.clients.discard(writer)
+            writer.close()
+
+    def send(self, rows: List[Dict[str, str]]):
+        lines = "".join(json.dumps(row) + "\n" for row in rows).encode("UTF-8")
+        for writer in list(self.clients):
+            if writer.is_closing():
+                self.clients.discard(writer)
+            else:
+                writer.write(lines)
+
+
+async def watch(
+    division: str,
+    output_path: str,
+    interval: float,
+    mirror: bool,
+    port: Optional[int] = None,
+):
+    broadcaster = RowBroadcaster()
+    if port:
+        await broadcaster.start(port)
+
+    def on_rows(rows: List[Dict[str, str]]):
+        util.append_data_to_csv(rows, output_path, ncaa.pbp_fields)
+        broadcaster.send(rows)
+
+    try:
+        await ncaa.watch_live_games(division, on_rows, interval, mirror)
+    finally:
+        await broadcaster.close()
+
+
+# Command line start point
+def main():
+    parser = argparse.ArgumentParser(
+        description="Follow today's live NCAA basketball games, adding new play by "
+        "play events to a CSV as they happen."
+    )
+
+    parser.add_argument(
+        "division",
+        type=str,
+        help="Division to lookup games in. Eg: d3.",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=15.0,
+        help="Seconds to wait between checks for new events.",
+    )
+    parser.add_argument(
+        "--mirror",
+        action="store_true",
+        help="Create a mirror record for each event with the home and visitor teams switched.",
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default="play_by_play_live.csv",
+        help="CSV file to add new events to.",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        help="Also send new events as lines of JSON to clients on this local port.",
+    )
+
+    args = parser.parse_args()
+
+    asyncio.run(
+        watch(args.division, args.output, args.interval, args.mirror, args.port)
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -3,15 +3,29 @@
 import argparse
 import asyncio
 from datetime import date
+from typing import Optional
 
 import ncaa_basketball.espn as espn
 import ncaa_basketball.util as util
+from ncaa_basketball.compression import add_suffix
+from ncaa_basketball.profiling import add_profile_argument, profile
 
 
-def compile_data(start_date: date, end_date: date, output_path: str):
-    games_data = asyncio.run(espn.get_games_data(start_date, end_date))
+def compile_data(
+    start_date: date,
+    end_date: date,
+    output_path: str,
+    compression: Optional[str] = None,
+    archive_path: Optional[str] = None,
+):
+    layout = espn.StatLayout()
+    with util.open_archive(archive_path) as archive:
+        games_data = asyncio.run(
+            espn.get_games_data(start_date, end_date, archive, layout)
+        )
 
-    util.write_data_to_csv(games_data, output_path)
+    fieldnames = espn.game_fieldnames(layout.stat_names())
+    util.write_data_to_csv(games_data, output_path, fieldnames, compression)
 
 
 # Command line start point
@@ -30,14 +44,29 @@ def main():
         type=str,
         help="Last date to fetch games from, inclusive.",
     )
+    parser.add_argument(
+        "--compress",
+        choices=["gzip", "zstd"],
+        help="Compress the output file.",
+    )
+    parser.add_argument(
+        "--archive",
+        type=str,
+        help="Directory to save the raw downloaded data in, for the reprocess command.",
+    )
+
+    add_profile_argument(parser)
 
     args = parser.parse_args()
 
-    compile_data(
-        date.fromisoformat(args.start_date),
-        date.fromisoformat(args.end_date),
-        "gamedata.csv",
-    )
+    with profile(args.profile):
+        compile_data(
+            date.fromisoformat(args.start_date),
+            date.fromisoformat(args.end_date),
+            add_suffix("gamedata.csv", args.compress),
+            args.compress,
+            args.archive,
+        )
 
 
 if __name__ == "__main__":
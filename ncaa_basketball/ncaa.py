@@ -2,13 +2,27 @@ import asyncio
 import hashlib
 import json
 import re
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import date, timedelta
-from typing import AsyncIterator, Dict, List, Set, Tuple
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    FrozenSet,
+    Iterator,
+    List,
+    Sequence,
+    Set,
+    Tuple,
+)
 
-import aiohttp
+from ncaa_basketball.archive import Archive
+from ncaa_basketball.util import client_session, get_url, shared_fetches
 
-from ncaa_basketball.util import get_url
+if TYPE_CHECKING:
+    import aiohttp
 
 gamelist_url = (
     "https://data.ncaa.com/casablanca/scoreboard/basketball-men/{}/{}/scoreboard.json"
@@ -23,10 +37,63 @@ player_capture = re.compile(r".*?(?:'s ?|-)(.+)")
 alt_player_capture = re.compile(r".*? by (.+)")
 player_sanitize = re.compile(r"(.+), (.+)")
 
+# A lineup should have 5 players, but poor data can leave more in the inferred
+# lineup. Anything beyond this does not get a column.
+max_lineup_size = 10
+
+# Output columns of expand_pbp_data, in order.
+pbp_fields = [
+    "gameID",
+    "period",
+    "time",
+    "timeSeconds",
+    "score",
+    "homeScore",
+    "visitorScore",
+    "homeText",
+    "visitorText",
+    "eventType",
+    "shotMade",
+    "isHomeEvent",
+    "homeTeamID",
+    "homeTeamName",
+    "homePlayer",
+    *(f"homePlayer{i}" for i in range(1, max_lineup_size + 1)),
+    "homePlayerUID",
+    "visitorTeamID",
+    "visitorTeamName",
+    "visitorPlayer",
+    *(f"visitorPlayer{i}" for i in range(1, max_lineup_size + 1)),
+    "visitorPlayerUID",
+    "isMirroredEvent",
+]
+
+# Event types given by get_event_type.
+event_types = [
+    "Sub",
+    "Turnover",
+    "Assist",
+    "Rebound",
+    "Block",
+    "End of period",
+    "Free throw",
+    "Layup",
+    "2 pointer",
+    "3 pointer",
+    "Jumper",
+    "Dunk",
+    "Short timeout",
+    "Media timeout",
+    "Full timeout",
+    "Offensive foul",
+    "Technical foul",
+    "Personal foul",
+]
+
 
 # Get all game IDs between the two dates, inclusive.
 async def get_game_list(
-    session: aiohttp.ClientSession,
+    session: "aiohttp.ClientSession",
     division: str,
     start_date: date,
     end_date: date,
@@ -39,25 +106,68 @@ async def get_game_list(
     for i in range(delta.days + 1):
         day = start_date + timedelta(days=i)
 
-        data = json.loads(
-            await get_url(
-                session, gamelist_url.format(division, day.strftime("%Y/%m/%d"))
-            )
-        )
-
-        gamelist = data.get("games", [])
-        for game in gamelist:
-            games.add(game["game"]["url"].removeprefix("/game/"))
+        for game in await get_day_games(session, division, day):
+            games.add(get_game_id(game))
 
     return games
 
 
+# Get the scoreboard entries of all games on the day. Set shared to False to
+# be sure to get the latest scores.
+async def get_day_games(
+    session: "aiohttp.ClientSession", division: str, day: date, shared: bool = True
+) -> List[Dict[str, Any]]:
+    url = gamelist_url.format(division, day.strftime("%Y/%m/%d"))
+    if shared:
+        data, _ = await get_json(session, url)
+    else:
+        data = json.loads(await get_url(session, url))
+
+    return data.get("games", [])
+
+
+# Download and parse JSON, along with its text. The data may be shared with
+# other callers, so don't change it.
+async def get_json(
+    session: "aiohttp.ClientSession", url: str
+) -> Tuple[Dict[str, Any], str]:
+    async def fetch() -> Tuple[Dict[str, Any], str]:
+        page = await get_url(session, url)
+        return json.loads(page), page
+
+    return await shared_fetches.get(url, fetch)
+
+
+def get_game_id(game: Dict[str, Any]) -> str:
+    return game["game"]["url"].removeprefix("/game/")
+
+
 # Get all game data for the given ID.
 async def get_pbp_data(
-    session: aiohttp.ClientSession, game_id: str
+    session: "aiohttp.ClientSession", game_id: str, archive: Archive | None = None
 ) -> AsyncIterator[List[Dict[str, str]]]:
-    data = json.loads(await get_url(session, play_by_play_url.format(game_id)))
+    data = await get_game_pbp(session, game_id, archive)
+    for events in split_pbp_data(game_id, data):
+        yield events
+
+
+# Get the play by play data of a game as it comes from the NCAA.
+async def get_game_pbp(
+    session: "aiohttp.ClientSession", game_id: str, archive: Archive | None = None
+) -> Dict[str, Any]:
+    url = play_by_play_url.format(game_id)
+    data, page = await get_json(session, url)
+    if archive:
+        archive.put(url, game_id, page)
+
+    return data
+
 
+# Split the play by play data of a game into the events of each period,
+# leaving out the given number of events at the start of each period.
+def split_pbp_data(
+    game_id: str, data: Dict[str, Any], skip_events: Sequence[int] = ()
+) -> Iterator[List[Dict[str, str]]]:
     game_data = dict()
     game_data["gameID"] = game_id
 
@@ -71,10 +181,11 @@ async def get_pbp_data(
 
     periods = data.get("periods", {})
 
-    for period in periods:
+    for index, period in enumerate(periods):
         events = list()
+        skip = skip_events[index] if index < len(skip_events) else 0
         game_data["period"] = period["periodNumber"]
-        for event in period["playStats"]:
+        for event in period["playStats"][skip:]:
             events.append(event | game_data)
 
         yield events
@@ -83,83 +194,46 @@ async def get_pbp_data(
 @dataclass
 class EventPlayers:
     event: Dict[str, str]
-    active_home_players: Set[str]
-    active_away_players: Set[str]
+    active_home_players: FrozenSet[str]
+    active_away_players: FrozenSet[str]
 
 
-def expand_pbp_data(events: List[Dict[str, str]], mirror: bool) -> List[Dict[str, str]]:
-    working_list: List[EventPlayers] = list()
-    active_home_players: Set[str] = set()
-    active_away_players: Set[str] = set()
-
-    previous_score = "0-0"
-
+# What is known about a game so far, carried from one event to the next and
+# from one period to the next. A period that starts without substitutions
+# keeps the players that ended the last one.
+@dataclass
+class GameState:
+    previous_score: str = "0-0"
+    active_home_players: FrozenSet[str] = frozenset()
+    active_away_players: FrozenSet[str] = frozenset()
+    # Events of the current period, waiting for players that show up later.
+    period_events: List[EventPlayers] = field(default_factory=list)
+    # Sorted players and UID of each lineup, since the same ones come up often.
+    lineups: Dict[FrozenSet[str], Tuple[List[str], str]] = field(default_factory=dict)
+
+
+# Expand the events of one period. Pass the same state for each period of a
+# game to carry the score and players over.
+def expand_pbp_data(
+    events: List[Dict[str, str]], mirror: bool, state: GameState | None = None
+) -> List[Dict[str, str]]:
+    state = state or GameState()
     for event in events:
-        if event["score"]:
-            previous_score = event["score"]
-        else:
-            event["score"] = previous_score
+        add_event(event, state)
 
-        event["homeScore"], event["visitorScore"] = event["score"].split("-")
-
-        time = event["time"].split(":")
-        event["timeSeconds"] = str(int(time[0]) * 60 + int(time[1]))
-
-        if text := event["homeText"]:
-            event["eventType"], event["shotMade"], with_player = get_event_type(text)
-            if with_player:
-                event["homePlayer"], event["visitorPlayer"] = get_player_from_event(
-                    text, event["homeTeamName"]
-                )
-            event["isHomeEvent"] = "TRUE"
-        elif text := event["visitorText"]:
-            event["eventType"], event["shotMade"], with_player = get_event_type(text)
-            if with_player:
-                event["visitorPlayer"], event["homePlayer"] = get_player_from_event(
-                    text, event["visitorTeamName"]
-                )
-            event["isHomeEvent"] = "FALSE"
-
-        if player := event.get("homePlayer"):
-            if "Subbing out" in event["homeText"]:
-                active_home_players.discard(player)
-            else:
-                active_home_players.add(player)
-
-        if player := event.get("visitorPlayer"):
-            if "Subbing out" in event["visitorText"]:
-                active_away_players.discard(player)
-            else:
-                active_away_players.add(player)
-
-        working_list.append(
-            EventPlayers(
-                event,
-                active_home_players.copy(),
-                active_away_players.copy(),
-            )
-        )
+    return finish_period(state, mirror)
 
-    for event_player in reversed(working_list):
-        event = event_player.event
-
-        if player := event.get("homePlayer"):
-            if "Subbing in" in event["homeText"]:
-                active_home_players.discard(player)
-            else:
-                active_home_players.add(player)
 
-        if player := event.get("visitorPlayer"):
-            if "Subbing in" in event["visitorText"]:
-                active_away_players.discard(player)
-            else:
-                active_away_players.add(player)
+# Add one event to the current period.
+def add_event(event: Dict[str, str], state: GameState, derive: bool = True):
+    state.period_events.append(expand_event(event, state, derive))
 
-        event_player.active_home_players.update(active_home_players)
-        event_player.active_away_players.update(active_away_players)
 
+# Fill in the players of each event in the period, now that all of its events
+# are known, and give back the finished rows.
+def finish_period(state: GameState, mirror: bool) -> List[Dict[str, str]]:
     results = list()
-    for event_player in working_list:
+    for event_player in take_period_events(state):
         event = event_player.event
 
         # if (
@@ -172,48 +246,154 @@ def expand_pbp_data(events: List[Dict[str, str]], mirror: bool) -> List[Dict[str
         #        )
         #    )
 
-        ordered_home_players = sorted(event_player.active_home_players)
-        ordered_away_players = sorted(event_player.active_away_players)
+        add_lineup(event_player, state)
+        results.append(event)
 
-        for i, player in enumerate(ordered_home_players, start=1):
-            event[f"homePlayer{i}"] = player
-        for i, player in enumerate(ordered_away_players, start=1):
-            event[f"visitorPlayer{i}"] = player
+        if mirror:
+            results.append(mirror_event(event))
 
-        home_player_hash = hashlib.sha256()
-        for player in ordered_home_players:
-            home_player_hash.update(player.encode("utf-8"))
-        event["homePlayerUID"] = home_player_hash.hexdigest()
+    return results
 
-        away_player_hash = hashlib.sha256()
-        for player in ordered_away_players:
-            away_player_hash.update(player.encode("utf-8"))
-        event["visitorPlayerUID"] = away_player_hash.hexdigest()
 
-        event["isMirroredEvent"] = "FALSE"
-        results.append(event)
+# Give back the events of the period with all of their players, and start the
+# next period.
+def take_period_events(state: GameState) -> List[EventPlayers]:
+    # Walk back from the end of the period, so players are also counted on the
+    # court before their first event. The forward state is left as it is, to
+    # start the next period with.
+    active_home_players = state.active_home_players
+    active_away_players = state.active_away_players
 
-        if mirror:
-            mirrored_event = dict()
-            for k, v in event.items():
-                if k.startswith("home"):
-                    key = "visitor" + k.removeprefix("home")
-                    mirrored_event[key] = v
-                elif k.startswith("visitor"):
-                    key = "home" + k.removeprefix("visitor")
-                    mirrored_event[key] = v
-                else:
-                    mirrored_event[k] = v
-
-            if mirrored_event.get("isHomeEvent") == "TRUE":
-                mirrored_event["isHomeEvent"] = "FALSE"
-            elif mirrored_event.get("isHomeEvent") == "FALSE":
-                mirrored_event["isHomeEvent"] = "TRUE"
-
-            mirrored_event["isMirroredEvent"] = "TRUE"
-            results.append(mirrored_event)
+    for event_player in reversed(state.period_events):
+        event = event_player.event
 
-    return results
+        if player := event.get("homePlayer"):
+            if "Subbing in" in event["homeText"]:
+                active_home_players = active_home_players - {player}
+            elif player not in active_home_players:
+                active_home_players = active_home_players | {player}
+
+        if player := event.get("visitorPlayer"):
+            if "Subbing in" in event["visitorText"]:
+                active_away_players = active_away_players - {player}
+            elif player not in active_away_players:
+                active_away_players = active_away_players | {player}
+
+        event_player.active_home_players |= active_home_players
+        event_player.active_away_players |= active_away_players
+
+    period_events = state.period_events
+    state.period_events = list()
+    return period_events
+
+
+# Fill in the derived fields of an event, and move the game state past it. The
+# players are only those known up to this event.
+# The score and time fields can be left out, for callers that work them out
+# for many events at once.
+def expand_event(
+    event: Dict[str, str], state: GameState, derive: bool = True
+) -> EventPlayers:
+    if derive:
+        if event["score"]:
+            state.previous_score = event["score"]
+        else:
+            event["score"] = state.previous_score
+
+        event["homeScore"], event["visitorScore"] = event["score"].split("-")
+
+        time = event["time"].split(":")
+        event["timeSeconds"] = str(int(time[0]) * 60 + int(time[1]))
+
+    if text := event["homeText"]:
+        event["eventType"], event["shotMade"], with_player = get_event_type(text)
+        if with_player:
+            event["homePlayer"], event["visitorPlayer"] = get_player_from_event(
+                text, event["homeTeamName"]
+            )
+        event["isHomeEvent"] = "TRUE"
+    elif text := event["visitorText"]:
+        event["eventType"], event["shotMade"], with_player = get_event_type(text)
+        if with_player:
+            event["visitorPlayer"], event["homePlayer"] = get_player_from_event(
+                text, event["visitorTeamName"]
+            )
+        event["isHomeEvent"] = "FALSE"
+
+    # Lineups are frozen sets that are only replaced when they change, so
+    # events in a row share the same one instead of each having a copy.
+    if player := event.get("homePlayer"):
+        if "Subbing out" in event["homeText"]:
+            if player in state.active_home_players:
+                state.active_home_players = state.active_home_players - {player}
+        elif player not in state.active_home_players:
+            state.active_home_players = state.active_home_players | {player}
+
+    if player := event.get("visitorPlayer"):
+        if "Subbing out" in event["visitorText"]:
+            if player in state.active_away_players:
+                state.active_away_players = state.active_away_players - {player}
+        elif player not in state.active_away_players:
+            state.active_away_players = state.active_away_players | {player}
+
+    return EventPlayers(event, state.active_home_players, state.active_away_players)
+
+
+# Write the players on the court into the event.
+def add_lineup(event_player: EventPlayers, state: GameState):
+    event = event_player.event
+
+    ordered_home_players, event["homePlayerUID"] = get_lineup(
+        event_player.active_home_players, state
+    )
+    ordered_away_players, event["visitorPlayerUID"] = get_lineup(
+        event_player.active_away_players, state
+    )
+
+    for i, player in enumerate(ordered_home_players[:max_lineup_size], start=1):
+        event[f"homePlayer{i}"] = player
+    for i, player in enumerate(ordered_away_players[:max_lineup_size], start=1):
+        event[f"visitorPlayer{i}"] = player
+
+    event["isMirroredEvent"] = "FALSE"
+
+
+# Get the sorted players and UID of a lineup.
+def get_lineup(players: FrozenSet[str], state: GameState) -> Tuple[List[str], str]:
+    if lineup := state.lineups.get(players):
+        return lineup
+
+    ordered_players = sorted(players)
+
+    player_hash = hashlib.sha256()
+    for player in ordered_players:
+        player_hash.update(player.encode("utf-8"))
+
+    lineup = (ordered_players, player_hash.hexdigest())
+    state.lineups[players] = lineup
+    return lineup
+
+
+# Copy the event with the home and visitor teams switched.
+def mirror_event(event: Dict[str, str]) -> Dict[str, str]:
+    mirrored_event = dict()
+    for k, v in event.items():
+        if k.startswith("home"):
+            key = "visitor" + k.removeprefix("home")
+            mirrored_event[key] = v
+        elif k.startswith("visitor"):
+            key = "home" + k.removeprefix("visitor")
+            mirrored_event[key] = v
+        else:
+            mirrored_event[k] = v
+
+    if mirrored_event.get("isHomeEvent") == "TRUE":
+        mirrored_event["isHomeEvent"] = "FALSE"
+    elif mirrored_event.get("isHomeEvent") == "FALSE":
+        mirrored_event["isHomeEvent"] = "TRUE"
+
+    mirrored_event["isMirroredEvent"] = "TRUE"
+    return mirrored_event
 
 
 def get_event_type(event: str) -> Tuple[str, str, bool]:
@@ -315,17 +495,34 @@ def sanitize_name(name: str) -> str:
         return name
 
 
+# Expand all periods of a game that was already downloaded.
+def expand_game_pbp(
+    game_id: str, data: Dict[str, Any], mirror: bool
+) -> List[Dict[str, str]]:
+    state = GameState()
+    results: List[Dict[str, str]] = list()
+    for events in split_pbp_data(game_id, data):
+        results.extend(expand_pbp_data(events, mirror, state))
+
+    return results
+
+
 async def get_games_pbp(
-    division: str, start_date: date, end_date: date, mirror: bool
+    division: str,
+    start_date: date,
+    end_date: date,
+    mirror: bool,
+    archive: Archive | None = None,
 ) -> List[Dict[str, str]]:
     games_data: List[Dict[str, str]] = list()
 
     async def gather_game_data(game: str):
-        data = get_pbp_data(session, game)
+        state = GameState()
+        data = get_pbp_data(session, game, archive)
         async for period in data:
-            games_data.extend(expand_pbp_data(period, mirror=mirror))
+            games_data.extend(expand_pbp_data(period, mirror, state))
 
-    async with aiohttp.ClientSession() as session:
+    async with client_session() as session:
         games = await get_game_list(session, division, start_date, end_date)
 
         # Run all game gathering tasks at the same time.
@@ -333,3 +530,98 @@ async def get_games_pbp(
         await asyncio.gather(*tasks)
 
     return games_data
+
+
+# A game being watched live, and how far into it we are.
+@dataclass
+class LiveGame:
+    game_id: str
+    state: GameState = field(default_factory=GameState)
+    # Number of events already processed in each period.
+    seen_events: List[int] = field(default_factory=list)
+
+
+# Expand only the events added since the last time. Later events are not known
+# yet, so the players on the court are only the ones seen so far. The game
+# state carries over between periods.
+def expand_new_events(
+    game: LiveGame, data: Dict[str, Any], mirror: bool
+) -> List[Dict[str, str]]:
+    results: List[Dict[str, str]] = list()
+
+    periods = split_pbp_data(game.game_id, data, game.seen_events)
+    for index, events in enumerate(periods):
+        if index == len(game.seen_events):
+            game.seen_events.append(0)
+
+        for event in events:
+            add_lineup(expand_event(event, game.state), game.state)
+            results.append(event)
+
+            if mirror:
+                results.append(mirror_event(event))
+
+        game.seen_events[index] += len(events)
+
+    return results
+
+
+# Poll today's live games until none are left, passing new rows to on_rows as
+# they come in. Failed downloads are tried again on the next poll.
+async def watch_live_games(
+    division: str,
+    on_rows: Callable[[List[Dict[str, str]]], None],
+    interval: float = 15.0,
+    mirror: bool = False,
+):
+    import aiohttp
+
+    watched: Dict[str, LiveGame] = dict()
+
+    async def poll_game(game: LiveGame):
+        try:
+            page = await get_url(session, play_by_play_url.format(game.game_id))
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print("WARNING: failed to poll game {}: {!r}".format(game.game_id, e))
+            return
+
+        try:
+            data = json.loads(page)
+        except json.JSONDecodeError:
+            # The play by play is not up yet, try again next time.
+            return
+
+        if rows := expand_new_events(game, data, mirror):
+            on_rows(rows)
+
+    async with client_session() as session:
+        while True:
+            try:
+                games = await get_day_games(
+                    session, division, date.today(), shared=False
+                )
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                print("WARNING: failed to get the scoreboard: {!r}".format(e))
+                await asyncio.sleep(interval)
+                continue
+
+            states = {
+                get_game_id(game): game["game"].get("gameState") for game in games
+            }
+
+            for game_id, state in states.items():
+                if state == "live" and game_id not in watched:
+                    watched[game_id] = LiveGame(game_id)
+
+            # Games that just ended get one more poll for their last events.
+            tasks = [poll_game(game) for game in watched.values()]
+            await asyncio.gather(*tasks)
+
+            for game_id, state in states.items():
+                if state == "final":
+                    watched.pop(game_id, None)
+
+            if not any(state in ("pre", "live") for state in states.values()):
+                return
+
+            await asyncio.sleep(interval)
@@ -3,19 +3,44 @@
 import argparse
 import asyncio
 from datetime import date
+from typing import Optional
 
 import ncaa_basketball.ncaa as ncaa
 import ncaa_basketball.util as util
+from ncaa_basketball.compression import add_suffix
+from ncaa_basketball.profiling import add_profile_argument, profile
 
 
 def compile_data(
-    division: str, start_date: date, end_date: date, output_path: str, mirror: bool
+    division: str,
+    start_date: date,
+    end_date: date,
+    output_path: str,
+    mirror: bool,
+    compression: Optional[str] = None,
+    archive_path: Optional[str] = None,
+    columnar: bool = False,
 ):
-    games_data = asyncio.run(
-        ncaa.get_games_pbp(division, start_date, end_date, mirror=mirror)
-    )
+    if columnar:
+        # Only needed here, and needs numpy.
+        import ncaa_basketball.columnar as columnar_pbp
+
+        with util.open_archive(archive_path) as archive:
+            columns = asyncio.run(
+                columnar_pbp.get_games_pbp_columns(
+                    division, start_date, end_date, mirror, archive
+                )
+            )
+
+        util.write_columns_to_csv(columns, output_path, ncaa.pbp_fields, compression)
+        return
+
+    with util.open_archive(archive_path) as archive:
+        games_data = asyncio.run(
+            ncaa.get_games_pbp(division, start_date, end_date, mirror, archive)
+        )
 
-    util.write_data_to_csv(games_data, output_path)
+    util.write_data_to_csv(games_data, output_path, ncaa.pbp_fields, compression)
 
 
 # Command line start point
@@ -44,16 +69,39 @@ def main():
         action="store_true",
         help="Create a mirror record for each event with the home and visitor teams switched.",
     )
+    parser.add_argument(
+        "--compress",
+        choices=["gzip", "zstd"],
+        help="Compress the output file.",
+    )
+    parser.add_argument(
+        "--archive",
+        type=str,
+        help="Directory to save the raw downloaded data in, for the reprocess command.",
+    )
+
+    parser.add_argument(
+        "--columnar",
+        action="store_true",
+        help="Build the fields of each game as numpy columns, instead of a "
+        "row for each event. Needs numpy.",
+    )
+
+    add_profile_argument(parser)
 
     args = parser.parse_args()
 
-    compile_data(
-        args.division,
-        date.fromisoformat(args.start_date),
-        date.fromisoformat(args.end_date),
-        "play_by_play.csv",
-        mirror=args.mirror,
-    )
+    with profile(args.profile):
+        compile_data(
+            args.division,
+            date.fromisoformat(args.start_date),
+            date.fromisoformat(args.end_date),
+            add_suffix("play_by_play.csv", args.compress),
+            mirror=args.mirror,
+            compression=args.compress,
+            archive_path=args.archive,
+            columnar=args.columnar,
+        )
 
 
 if __name__ == "__main__":
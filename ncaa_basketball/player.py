@@ -2,23 +2,83 @@
 
 import argparse
 import asyncio
-from typing import List, Optional
+from typing import Optional
 
 import ncaa_basketball.espn as espn
 import ncaa_basketball.util as util
+from ncaa_basketball.compression import add_suffix
+from ncaa_basketball.profiling import add_profile_argument, profile
 
 
 def compile_data(
-    output_path: str, group_filter: List[str] = [], player: Optional[str] = None
+    output_path: str,
+    projection: espn.StatProjection = espn.StatProjection(),
+    player: Optional[str] = None,
+    compression: Optional[str] = None,
+    archive_path: Optional[str] = None,
 ):
     player_data = list()
+    layout = espn.StatLayout()
 
-    if player:
-        player_data = [asyncio.run(espn.get_player_data(None, player))]
-    else:
-        player_data = asyncio.run(espn.get_league_players_data(group_filter))
+    with util.open_archive(archive_path) as archive:
+        if player:
+            player_data = [
+                asyncio.run(
+                    espn.get_player_data(None, player, projection, archive, layout)
+                )
+            ]
+        else:
+            player_data = asyncio.run(
+                espn.get_league_players_data(projection, archive, layout)
+            )
 
-    util.write_data_to_csv(player_data, output_path)
+    fieldnames = espn.player_fieldnames(projection, layout.stat_names())
+    util.write_data_to_csv(player_data, output_path, fieldnames, compression)
+
+
+def add_projection_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--group-filter",
+        type=str,
+        action="append",
+        default=[],
+        help="Name of a group of stats to include. Can be specified multiple times.",
+    )
+    parser.add_argument(
+        "--stat-filter",
+        type=str,
+        action="append",
+        default=[],
+        help="Name of a stat to include, Eg: Points. Can be specified multiple times.",
+    )
+    parser.add_argument(
+        "--season",
+        type=str,
+        action="append",
+        default=[],
+        help="Season to include, Eg: 2022-23. Can be specified multiple times.",
+    )
+    parser.add_argument(
+        "--current-season",
+        action="store_true",
+        help="Only include stats from the newest season of each player, in "
+        "columns labelled Current.",
+    )
+    parser.add_argument(
+        "--no-career",
+        action="store_true",
+        help="Do not include the career totals.",
+    )
+
+
+def projection_from_args(args: argparse.Namespace) -> espn.StatProjection:
+    return espn.StatProjection(
+        groups=args.group_filter,
+        stats=args.stat_filter,
+        seasons=args.season,
+        current_season_only=args.current_season,
+        career=not args.no_career,
+    )
 
 
 # Command line start point
@@ -32,16 +92,30 @@ def main():
         type=str,
         help="Player ID to get stats for.",
     )
+    add_projection_arguments(parser)
     parser.add_argument(
-        "--group-filter",
+        "--compress",
+        choices=["gzip", "zstd"],
+        help="Compress the output file.",
+    )
+    parser.add_argument(
+        "--archive",
         type=str,
-        action="append",
-        help="Name of a group of stats to include. Can be specified multiple times.",
+        help="Directory to save the raw downloaded data in, for the reprocess command.",
     )
 
+    add_profile_argument(parser)
+
     args = parser.parse_args()
 
-    compile_data("playerdata.csv", args.group_filter, args.player)
+    with profile(args.profile):
+        compile_data(
+            add_suffix("playerdata.csv", args.compress),
+            projection_from_args(args),
+            args.player,
+            args.compress,
+            args.archive,
+        )
 
 
 if __name__ == "__main__":
@@ -3,6 +3,7 @@
 import tkinter
 from typing import List
 
+import ncaa_basketball.espn as espn
 import ncaa_basketball.gui as gui
 import ncaa_basketball.player as player
 
@@ -33,6 +34,21 @@ class PlayerGui(gui.Gui):
         )
         self.misc_label.grid(column=2, row=1)
 
+        self.season_header_label = tkinter.Label(self, text="Seasons to include:")
+        self.season_header_label.grid(column=0, row=2)
+
+        self.current_enabled = tkinter.IntVar()
+        self.current_label = tkinter.Checkbutton(
+            self, variable=self.current_enabled, text="Current season only"
+        )
+        self.current_label.grid(column=0, row=3)
+
+        self.career_enabled = tkinter.IntVar(value=1)
+        self.career_label = tkinter.Checkbutton(
+            self, variable=self.career_enabled, text="Career totals"
+        )
+        self.career_label.grid(column=1, row=3)
+
     def run_program(self) -> None:
         group_filter: List[str] = list()
 
@@ -43,7 +59,13 @@ class PlayerGui(gui.Gui):
         if self.misc_enabled.get():
             group_filter.append("Season Misc Totals")
 
-        player.compile_data(self.output, group_filter)
+        projection = espn.StatProjection(
+            groups=group_filter,
+            current_season_only=bool(self.current_enabled.get()),
+            career=bool(self.career_enabled.get()),
+        )
+
+        player.compile_data(self.output, projection)
 
 
 if __name__ == "__main__":
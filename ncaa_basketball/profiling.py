@@ -0,0 +1,193 @@
+import argparse
+import asyncio
+import contextlib
+import cProfile
+import json
+import sys
+import threading
+import time
+from types import CodeType, FrameType
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# (name, file, line) of a function in a profile.
+Frame = Tuple[str, str, int]
+
+
+# Samples what every thread is running, and what every asyncio task is waiting
+# on, from a background thread. Tasks waiting on the network don't show up on
+# any thread's stack, so their await chains are sampled as well: that is where
+# a scraper spends most of its time.
+class SamplingProfiler:
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.frames: Dict[Frame, int] = dict()
+        # Time spent in each stack, per thread, plus one for the tasks.
+        self.stacks: Dict[str, Dict[Tuple[int, ...], float]] = dict()
+        self.start_time = 0.0
+        self.end_time = 0.0
+
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.start_time = time.perf_counter()
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        self.end_time = time.perf_counter()
+
+    def run(self):
+        last_sample = time.perf_counter()
+        while not self.stopped.wait(self.interval):
+            # The thread may wait longer than asked for the GIL, so weigh each
+            # sample by the time that really passed.
+            now = time.perf_counter()
+            self.sample(now - last_sample)
+            last_sample = now
+
+    def sample(self, weight: float):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == threading.get_ident():
+                continue
+
+            stack = self.frame_stack(frame)
+            name = "Thread {}".format(names.get(thread_id, thread_id))
+            self.add_sample(name, stack, weight)
+
+            if loop := self.find_loop(frame):
+                for task in asyncio.all_tasks(loop):
+                    self.add_sample("Tasks", self.task_stack(task), weight)
+
+    def add_sample(self, name: str, stack: List[Frame], weight: float):
+        key = tuple(self.frames.setdefault(frame, len(self.frames)) for frame in stack)
+        stacks = self.stacks.setdefault(name, dict())
+        stacks[key] = stacks.get(key, 0.0) + weight
+
+    # The functions the frame is in, outermost first.
+    def frame_stack(self, frame: Optional[FrameType]) -> List[Frame]:
+        stack = list()
+        while frame:
+            stack.append(self.code_frame(frame.f_code, frame.f_lineno))
+            frame = frame.f_back
+        stack.reverse()
+        return stack
+
+    # The coroutines the task is in, from the task down to what it awaits.
+    def task_stack(self, task: asyncio.Task) -> List[Frame]:
+        stack: List[Frame] = list()
+        awaiting: Any = task.get_coro()
+        while awaiting is not None:
+            if code := getattr(awaiting, "cr_code", None):
+                frame = awaiting.cr_frame
+                stack.append(self.code_frame(code, frame.f_lineno if frame else 0))
+                awaiting = awaiting.cr_await
+            elif code := getattr(awaiting, "gi_code", None):
+                frame = awaiting.gi_frame
+                stack.append(self.code_frame(code, frame.f_lineno if frame else 0))
+                awaiting = awaiting.gi_yieldfrom
+            else:
+                # A future or async generator, which can't be followed further.
+                stack.append(("<{}>".format(type(awaiting).__name__), "", 0))
+                break
+        return stack
+
+    # The event loop running in the thread of the frame, if there is one.
+    def find_loop(
+        self, frame: Optional[FrameType]
+    ) -> Optional[asyncio.AbstractEventLoop]:
+        while frame:
+            if frame.f_code is run_forever_code:
+                return frame.f_locals.get("self")
+            frame = frame.f_back
+        return None
+
+    def code_frame(self, code: CodeType, line: int) -> Frame:
+        name = getattr(code, "co_qualname", code.co_name)
+        return (name, code.co_filename, line or code.co_firstlineno)
+
+    # Write the samples in the speedscope format, one profile per thread.
+    # Open it at https://www.speedscope.app.
+    def save(self, path: str):
+        frames = sorted(self.frames, key=self.frames.__getitem__)
+        profiles = list()
+        for name, stacks in self.stacks.items():
+            profiles.append(
+                {
+                    "type": "sampled",
+                    "name": name,
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": self.end_time - self.start_time,
+                    "samples": [list(stack) for stack in stacks],
+                    "weights": list(stacks.values()),
+                }
+            )
+
+        with open(path, "w", encoding="UTF-8") as profile_file:
+            json.dump(
+                {
+                    "$schema": "https://www.speedscope.app/file-format-schema.json",
+                    "shared": {
+                        "frames": [
+                            {"name": name, "file": file, "line": line}
+                            for name, file, line in frames
+                        ]
+                    },
+                    "profiles": profiles,
+                    "name": " ".join(sys.argv),
+                    "exporter": "ncaa_basketball.profiling",
+                },
+                profile_file,
+            )
+
+
+run_forever_code = asyncio.BaseEventLoop.run_forever.__code__
+
+
+# Profile what runs inside, and save it to the path. A .prof file is a cProfile
+# dump for snakeviz, and a .json file is a sampling profile for speedscope.
+@contextlib.contextmanager
+def profile(path: Optional[str]) -> Iterator[None]:
+    if not path:
+        yield
+        return
+
+    if path.endswith(".prof"):
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(path)
+        return
+
+    sampler = SamplingProfiler()
+    sampler.start()
+    try:
+        yield
+    finally:
+        sampler.stop()
+        sampler.save(path)
+
+
+def profile_path(path: str) -> str:
+    if not path.endswith((".prof", ".json")):
+        raise argparse.ArgumentTypeError(
+            "profile must be a .prof (cProfile) or .json (speedscope) file"
+        )
+    return path
+
+
+def add_profile_argument(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--profile",
+        type=profile_path,
+        metavar="PATH",
+        help="Profile the run and save it to this file. A .prof file is a "
+        "cProfile dump for snakeviz, and a .json file is a sampling profile "
+        "of the threads and asyncio tasks for speedscope.",
+    )
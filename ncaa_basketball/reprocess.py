@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+
+import argparse
+import functools
+import json
+import os
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from typing import Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+import ncaa_basketball.espn as espn
+import ncaa_basketball.ncaa as ncaa
+import ncaa_basketball.player as player
+import ncaa_basketball.util as util
+from ncaa_basketball.archive import Archive, ArchiveEntry, read_entries
+from ncaa_basketball.compression import add_suffix
+
+# Entries each worker process reads and processes at a time.
+batch_size = 16
+
+default_outputs = {
+    "matchup": "gamedata.csv",
+    "player": "playerdata.csv",
+    "play_by_play": "play_by_play.csv",
+}
+
+
+# These run in worker processes, so they take the archived key and payload and
+# give back finished rows.
+def process_game(item: Tuple[str, str]) -> List[Dict[str, str]]:
+    game_id, payload = item
+    return [espn.parse_game_data(game_id, json.loads(payload))]
+
+
+def process_player(
+    projection: espn.StatProjection, item: Tuple[str, str]
+) -> List[Dict[str, str]]:
+    player_id, payload = item
+    return [espn.parse_player_data(player_id, json.loads(payload), projection)]
+
+
+def process_pbp(mirror: bool, item: Tuple[str, str]) -> List[Dict[str, str]]:
+    game_id, payload = item
+    return ncaa.expand_game_pbp(game_id, json.loads(payload), mirror)
+
+
+# Read a batch of entries from the archive's data file and process them. The
+# payloads are only ever in the worker process, never in the main one.
+def process_batch(
+    process: Callable[[Tuple[str, str]], List[Dict[str, str]]],
+    data_path: str,
+    entries: List[ArchiveEntry],
+) -> List[Dict[str, str]]:
+    rows: List[Dict[str, str]] = list()
+    for item in read_entries(data_path, entries):
+        rows.extend(process(item))
+    return rows
+
+
+# Pages are parsed in the worker processes, so the stat names of the schema are
+# read from the first archived page here. Stats that only later pages have are
+# still written, as extra columns.
+def first_page_layout(
+    archive: Archive,
+    entries: List[ArchiveEntry],
+    parse: Callable[..., Dict[str, str]],
+) -> espn.StatLayout:
+    layout = espn.StatLayout()
+    for key, payload in archive.read(entries[:1]):
+        parse(key, json.loads(payload), layout=layout)
+    return layout
+
+
+# Process batches in the executor and give back their rows in order. Unlike
+# Executor.map, only a few batches are sent ahead of the one being written,
+# so finished rows don't pile up in memory while the first ones wait.
+def process_batches(
+    executor: Executor,
+    process: Callable[[List[ArchiveEntry]], List[Dict[str, str]]],
+    batches: Iterator[List[ArchiveEntry]],
+    ahead: int,
+) -> Iterator[Dict[str, str]]:
+    pending: Deque[Future] = deque()
+    for batch in batches:
+        pending.append(executor.submit(process, batch))
+        if len(pending) >= ahead:
+            yield from pending.popleft().result()
+
+    while pending:
+        yield from pending.popleft().result()
+
+
+# Rebuild a dataset from an archive made with the --archive option, without
+# downloading anything. Payloads are read and processed in parallel on all
+# cores.
+def compile_data(
+    archive_path: str,
+    dataset: str,
+    output_path: str,
+    mirror: bool = False,
+    projection: espn.StatProjection = espn.StatProjection(),
+    compression: Optional[str] = None,
+    jobs: Optional[int] = None,
+):
+    process: Callable[[Tuple[str, str]], List[Dict[str, str]]]
+    fieldnames: Optional[List[str]]
+
+    if dataset == "matchup":
+        url_prefix = espn.gamestats_url.format("")
+        process = process_game
+    elif dataset == "player":
+        url_prefix = espn.playerstats_url.format("")
+        process = functools.partial(process_player, projection)
+    elif dataset == "play_by_play":
+        url_prefix = ncaa.play_by_play_url.split("{}")[0]
+        process = functools.partial(process_pbp, mirror)
+    else:
+        raise ValueError("Unknown dataset: {}".format(dataset))
+
+    with Archive(archive_path) as archive:
+        entries = archive.entries(url_prefix)
+        data_path = archive.data_path
+
+        if dataset == "matchup":
+            layout = first_page_layout(archive, entries, espn.parse_game_data)
+            fieldnames = espn.game_fieldnames(layout.stat_names())
+        elif dataset == "player":
+            parse = functools.partial(espn.parse_player_data, projection=projection)
+            layout = first_page_layout(archive, entries, parse)
+            fieldnames = espn.player_fieldnames(projection, layout.stat_names())
+        else:
+            fieldnames = ncaa.pbp_fields
+
+    batches = (
+        entries[start : start + batch_size]
+        for start in range(0, len(entries), batch_size)
+    )
+    jobs = jobs or os.cpu_count() or 1
+
+    with ProcessPoolExecutor(jobs) as executor:
+        util.write_data_to_csv(
+            process_batches(
+                executor,
+                functools.partial(process_batch, process, data_path),
+                batches,
+                ahead=jobs * 2,
+            ),
+            output_path,
+            fieldnames,
+            compression,
+        )
+
+
+# Command line start point
+def main():
+    parser = argparse.ArgumentParser(
+        description="Rebuild a CSV file from archived data, without downloading it."
+    )
+
+    parser.add_argument(
+        "archive",
+        type=str,
+        help="Archive directory made with the --archive option.",
+    )
+    parser.add_argument(
+        "dataset",
+        choices=default_outputs.keys(),
+        help="Which data to rebuild.",
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        help="File to write to. Defaults to the file the dataset's own command writes.",
+    )
+    parser.add_argument(
+        "--mirror",
+        action="store_true",
+        help="Create a mirror record for each event with the home and visitor teams switched.",
+    )
+    player.add_projection_arguments(parser)
+    parser.add_argument(
+        "--compress",
+        choices=["gzip", "zstd"],
+        help="Compress the output file.",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        help="Number of processes to use. Defaults to the number of cores.",
+    )
+
+    args = parser.parse_args()
+
+    compile_data(
+        args.archive,
+        args.dataset,
+        args.output or add_suffix(default_outputs[args.dataset], args.compress),
+        mirror=args.mirror,
+        projection=player.projection_from_args(args),
+        compression=args.compress,
+        jobs=args.jobs,
+    )
+
+
+if __name__ == "__main__":
+    main()
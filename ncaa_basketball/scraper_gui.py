@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+
+import argparse
+import functools
+import tkinter
+from typing import Callable, Dict, Optional, Tuple
+
+
+# Each scraper is only imported once it is chosen, so the launcher opens right
+# away. The imports are written out so PyInstaller still finds them.
+def open_matchup() -> tkinter.Tk:
+    from ncaa_basketball.matchup_gui import MatchupGui
+
+    return MatchupGui()
+
+
+def open_player() -> tkinter.Tk:
+    from ncaa_basketball.player_gui import PlayerGui
+
+    return PlayerGui()
+
+
+def open_play_by_play() -> tkinter.Tk:
+    from ncaa_basketball.play_by_play_gui import PbPGui
+
+    return PbPGui()
+
+
+tools: Dict[str, Tuple[str, Callable[[], tkinter.Tk]]] = {
+    "matchup": ("Matchup stats", open_matchup),
+    "player": ("Player stats", open_player),
+    "play_by_play": ("Play by play stats", open_play_by_play),
+}
+
+
+class LauncherGui(tkinter.Tk):
+    def __init__(self, *args, **kwargs):
+        tkinter.Tk.__init__(self, *args, **kwargs)
+        self.title("NCAA Basketball stats scrappers")
+
+        self.choice: Optional[str] = None
+
+        self.header_label = tkinter.Label(self, text="Choose a scrapper:")
+        self.header_label.grid(column=0, row=0)
+
+        for row, (name, (text, _)) in enumerate(tools.items(), start=1):
+            button = tkinter.Button(
+                self, text=text, command=functools.partial(self.choose, name)
+            )
+            button.grid(column=0, row=row, sticky="ew")
+
+    def choose(self, name: str):
+        self.choice = name
+        self.destroy()
+
+
+# Command line start point
+def main():
+    parser = argparse.ArgumentParser(
+        description="Open one of the NCAA basketball scrapper windows."
+    )
+
+    parser.add_argument(
+        "tool",
+        nargs="?",
+        choices=tools.keys(),
+        help="Scrapper to open right away, instead of choosing one.",
+    )
+
+    args = parser.parse_args()
+
+    name = args.tool
+    if name is None:
+        launcher = LauncherGui()
+        launcher.mainloop()
+        name = launcher.choice
+
+    if name:
+        _, open_tool = tools[name]
+        open_tool().mainloop()
+
+
+if __name__ == "__main__":
+    main()
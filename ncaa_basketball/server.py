@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+
+import argparse
+import asyncio
+import dataclasses
+import hashlib
+import itertools
+from datetime import date
+from typing import Awaitable, Callable, Dict, List, Mapping, Tuple
+
+from aiohttp import web
+
+import ncaa_basketball.espn as espn
+import ncaa_basketball.ncaa as ncaa
+import ncaa_basketball.util as util
+from ncaa_basketball.store import Store, datasets, unsupported_filters
+
+default_limit = 100
+max_limit = 1000
+
+
+# Serve rows of a dataset as JSON, filtered and paged by the query string. The
+# ETag changes whenever the dataset does, so clients can cache the results.
+async def get_rows(request: web.Request) -> web.Response:
+    dataset = request.match_info["dataset"]
+    if dataset not in datasets:
+        raise web.HTTPNotFound(text="Unknown dataset: {}".format(dataset))
+
+    store = request.app["store"]
+    query = sorted(request.query.items())
+    etag = hashlib.sha1(
+        "{}:{}:{}".format(dataset, store.version(dataset), query).encode("UTF-8")
+    ).hexdigest()
+
+    if etag in request.headers.get("If-None-Match", ""):
+        raise web.HTTPNotModified(headers={"ETag": f'"{etag}"'})
+
+    try:
+        limit = min(int(request.query.get("limit", default_limit)), max_limit)
+        offset = int(request.query.get("offset", 0))
+    except ValueError:
+        raise web.HTTPBadRequest(text="limit and offset must be numbers")
+    if limit < 0 or offset < 0:
+        raise web.HTTPBadRequest(text="limit and offset cannot be negative")
+
+    params = dict(request.query)
+    if unsupported := unsupported_filters(dataset, params):
+        raise web.HTTPBadRequest(
+            text="Cannot filter {} by: {}".format(dataset, ", ".join(unsupported))
+        )
+
+    total, rows = store.query(dataset, params, limit, offset)
+
+    return web.json_response(
+        {"total": total, "limit": limit, "offset": offset, "rows": rows},
+        headers={"ETag": f'"{etag}"', "Cache-Control": "no-cache"},
+    )
+
+
+def get_dates(query: Mapping[str, str]) -> Tuple[date, date]:
+    try:
+        start_date = date.fromisoformat(query["start"])
+        end_date = date.fromisoformat(query.get("end", query["start"]))
+    except (KeyError, ValueError):
+        raise web.HTTPBadRequest(text="start (and optional end) dates are needed")
+
+    return start_date, end_date
+
+
+async def refresh_games(query: Mapping[str, str]) -> List[Dict[str, str]]:
+    start_date, end_date = get_dates(query)
+    return await espn.get_games_data(start_date, end_date)
+
+
+async def refresh_players(query: Mapping[str, str]) -> List[Dict[str, str]]:
+    if player := query.get("player"):
+        return [await espn.get_player_data(None, player)]
+    return await espn.get_league_players_data()
+
+
+async def refresh_play_by_play(query: Mapping[str, str]) -> List[Dict[str, str]]:
+    start_date, end_date = get_dates(query)
+    return await ncaa.get_games_pbp(
+        query.get("division", "d1"),
+        start_date,
+        end_date,
+        mirror=query.get("mirror") == "true",
+    )
+
+
+refreshers: Dict[str, Callable[[Mapping[str, str]], Awaitable[List[Dict[str, str]]]]]
+refreshers = {
+    "games": refresh_games,
+    "players": refresh_players,
+    "play_by_play": refresh_play_by_play,
+}
+
+
+# Start downloading fresh data into the store in the background. The same
+# refresh asked for twice while running is only run once.
+async def start_refresh(request: web.Request) -> web.Response:
+    dataset = request.match_info["dataset"]
+    if dataset not in refreshers:
+        raise web.HTTPNotFound(text="Cannot refresh dataset: {}".format(dataset))
+
+    refresh_id = hashlib.sha1(
+        "{}:{}".format(dataset, sorted(request.query.items())).encode("UTF-8")
+    ).hexdigest()[:16]
+
+    query = dict(request.query)
+    store = request.app["store"]
+    refreshes = request.app["refreshes"]
+    if refresh_id not in refreshes or refreshes[refresh_id].done():
+        # Check the parameters now, rather than failing in the background.
+        if dataset != "players":
+            get_dates(query)
+
+        async def refresh():
+            rows = await refreshers[dataset](query)
+            await asyncio.to_thread(store.add, dataset, rows)
+
+        refreshes[refresh_id] = asyncio.create_task(refresh())
+
+    return web.json_response(
+        {"id": refresh_id, "status": refresh_status(refreshes[refresh_id])},
+        status=202,
+    )
+
+
+async def get_refresh(request: web.Request) -> web.Response:
+    refresh_id = request.match_info["refresh_id"]
+    if task := request.app["refreshes"].get(refresh_id):
+        return web.json_response({"id": refresh_id, "status": refresh_status(task)})
+
+    raise web.HTTPNotFound(text="Unknown refresh: {}".format(refresh_id))
+
+
+def refresh_status(task: asyncio.Task) -> str:
+    if not task.done():
+        return "running"
+    if task.cancelled():
+        return "cancelled"
+    if error := task.exception():
+        return "failed: {}".format(error)
+    return "done"
+
+
+async def get_metrics(request: web.Request) -> web.Response:
+    shared_fetches = util.shared_fetches
+    return web.json_response(
+        {
+            "limiter": dataclasses.asdict(util.limiter.metrics()),
+            "shared_fetches": {
+                "hits": shared_fetches.hits,
+                "shared": shared_fetches.shared,
+                "misses": shared_fetches.misses,
+            },
+        }
+    )
+
+
+def make_app(store: Store) -> web.Application:
+    app = web.Application()
+    app["store"] = store
+    app["refreshes"] = dict()
+
+    app.add_routes(
+        [
+            web.get("/metrics", get_metrics),
+            web.get("/refresh/{refresh_id}", get_refresh),
+            web.post("/refresh/{dataset}", start_refresh),
+            web.get("/{dataset}", get_rows),
+        ]
+    )
+
+    return app
+
+
+# Load CSV files written by the other commands into the store.
+def load_csv(store: Store, dataset: str, path: str):
+    rows = util.read_data_from_csv(path)
+    if dataset == "play_by_play":
+        store.add(dataset, rows)
+        return
+
+    # Add in batches so a big file doesn't need to fit in memory.
+    while batch := list(itertools.islice(rows, 10000)):
+        store.add(dataset, batch)
+
+
+# Command line start point
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve scraped NCAA basketball data over HTTP from a local store."
+    )
+
+    parser.add_argument(
+        "--store",
+        type=str,
+        default="ncaa_basketball.db",
+        help="SQLite file to keep the data in.",
+    )
+    parser.add_argument(
+        "--load",
+        type=str,
+        action="append",
+        default=[],
+        metavar="DATASET=PATH",
+        help="Load a CSV file into the store first, Eg: games=gamedata.csv. "
+        "Can be specified multiple times.",
+    )
+    parser.add_argument(
+        "--host",
+        type=str,
+        default="127.0.0.1",
+        help="Address to listen on.",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=8080,
+        help="Port to listen on.",
+    )
+
+    args = parser.parse_args()
+
+    store = Store(args.store)
+
+    for load in args.load:
+        dataset, _, path = load.partition("=")
+        if dataset not in datasets or dataset == "lineups":
+            parser.error("Cannot load dataset: {}".format(dataset))
+        load_csv(store, dataset, path)
+
+    try:
+        web.run_app(make_app(store), host=args.host, port=args.port)
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
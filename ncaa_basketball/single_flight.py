@@ -0,0 +1,71 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+# Shares the work of getting the same thing more than once. Callers asking for
+# a key that is already being fetched wait for that fetch instead of starting
+# their own, and results are kept in a small LRU cache for a short time.
+#
+# Cached results are shared between callers, so they must not be changed.
+class SingleFlight:
+    def __init__(self, max_size: int = 256, max_age: float = 30.0):
+        self.max_size = max_size
+        self.max_age = max_age
+        self.cache: OrderedDict[str, Tuple[float, Any]] = OrderedDict()
+        # Fetches in progress, per event loop since they can't be shared.
+        self.in_flight: Dict[Tuple[asyncio.AbstractEventLoop, str], asyncio.Task] = {}
+        # The cache is shared by every event loop, in any thread.
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.shared = 0
+        self.misses = 0
+
+    async def get(self, key: str, fetch: Callable[[], Awaitable[T]]) -> T:
+        with self.lock:
+            if entry := self.cache.get(key):
+                fetched, value = entry
+                if time.monotonic() - fetched < self.max_age:
+                    self.cache.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self.cache[key]
+
+        loop = asyncio.get_running_loop()
+        if task := self.in_flight.get((loop, key)):
+            self.shared += 1
+        else:
+            self.misses += 1
+            task = asyncio.ensure_future(self.fetch(loop, key, fetch))
+            self.in_flight[(loop, key)] = task
+
+        # One caller giving up should not cancel the fetch for the others.
+        return await asyncio.shield(task)
+
+    async def fetch(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        key: str,
+        fetch: Callable[[], Awaitable[T]],
+    ) -> T:
+        try:
+            value = await fetch()
+        finally:
+            del self.in_flight[(loop, key)]
+
+        with self.lock:
+            self.cache[key] = (time.monotonic(), value)
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.max_size:
+                self.cache.popitem(last=False)
+
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.cache.clear()
@@ -0,0 +1,248 @@
+import contextlib
+import json
+import sqlite3
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+# Where to find the indexed values in the rows of a dataset.
+@dataclass
+class DatasetFields:
+    game: Optional[str] = None
+    home_team: Optional[str] = None
+    away_team: Optional[str] = None
+    player: Optional[str] = None
+    date: Optional[str] = None
+
+
+datasets = {
+    "games": DatasetFields(
+        game="GameID",
+        home_team="hometeam ID",
+        away_team="awayteam ID",
+        date="Game Date",
+    ),
+    "players": DatasetFields(player="player ID", home_team="team ID"),
+    "play_by_play": DatasetFields(
+        game="gameID", home_team="homeTeamID", away_team="visitorTeamID"
+    ),
+    "lineups": DatasetFields(game="gameID", home_team="teamID"),
+}
+
+# Query filters, the indexed value they need, and the SQL they add.
+filters = {
+    "game": ("game", "game = ?"),
+    "team": ("home_team", "(home_team = ? OR away_team = ?)"),
+    "player": ("player", "player = ?"),
+    "date": ("date", "date = ?"),
+    "date_from": ("date", "date >= ?"),
+    "date_to": ("date", "date <= ?"),
+}
+
+
+# The filters in the params that the dataset has no value indexed for. They
+# would match no rows at all.
+def unsupported_filters(dataset: str, params: Dict[str, str]) -> List[str]:
+    fields = datasets[dataset]
+    return [
+        name
+        for name in params
+        if name in filters and getattr(fields, filters[name][0]) is None
+    ]
+
+
+schema = """
+CREATE TABLE IF NOT EXISTS records (
+    dataset TEXT NOT NULL,
+    key TEXT NOT NULL,
+    game TEXT,
+    home_team TEXT,
+    away_team TEXT,
+    player TEXT,
+    date TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (dataset, key)
+);
+CREATE INDEX IF NOT EXISTS records_game ON records (dataset, game);
+CREATE INDEX IF NOT EXISTS records_home_team ON records (dataset, home_team);
+CREATE INDEX IF NOT EXISTS records_away_team ON records (dataset, away_team);
+CREATE INDEX IF NOT EXISTS records_player ON records (dataset, player);
+CREATE INDEX IF NOT EXISTS records_date ON records (dataset, date);
+CREATE TABLE IF NOT EXISTS versions (
+    dataset TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+"""
+
+
+# A local SQLite store of scraped rows, indexed by game, team, player and date.
+# Every change to a dataset bumps its version, so readers can tell when their
+# cached results are stale.
+class Store:
+    def __init__(self, path: str):
+        self.path = path
+        with self.transaction() as connection:
+            connection.executescript(schema)
+        self.connection = self.connect()
+
+    def connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        # Let reads go on while a refresh is writing.
+        connection.execute("PRAGMA journal_mode=WAL")
+        return connection
+
+    # A separate connection for a batch of writes, committed at the end.
+    @contextlib.contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        connection = self.connect()
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def close(self):
+        self.connection.close()
+
+    def version(self, dataset: str) -> int:
+        row = self.connection.execute(
+            "SELECT version FROM versions WHERE dataset = ?", (dataset,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def query(
+        self, dataset: str, params: Dict[str, str], limit: int, offset: int
+    ) -> Tuple[int, List[Dict[str, Any]]]:
+        where = ["dataset = ?"]
+        args: List[Any] = [dataset]
+        for name, value in params.items():
+            if name in filters:
+                clause = filters[name][1]
+                where.append(clause)
+                args.extend([value] * clause.count("?"))
+
+        condition = " AND ".join(where)
+        total = self.connection.execute(
+            f"SELECT COUNT(*) FROM records WHERE {condition}", args
+        ).fetchone()[0]
+        rows = self.connection.execute(
+            f"SELECT data FROM records WHERE {condition} "
+            "ORDER BY rowid LIMIT ? OFFSET ?",
+            args + [limit, offset],
+        ).fetchall()
+
+        return total, [json.loads(row[0]) for row in rows]
+
+    # Add or replace rows of a dataset. This uses its own connection, so it can
+    # be run in another thread.
+    def add(self, dataset: str, rows: Iterable[Dict[str, str]]):
+        if dataset == "play_by_play":
+            self.add_play_by_play(list(rows))
+            return
+
+        fields = datasets[dataset]
+        key_field = fields.game or fields.player
+        if key_field is None:
+            raise ValueError("Dataset has no key field: {}".format(dataset))
+
+        with self.transaction() as connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (self.record(dataset, row[key_field], row) for row in rows),
+            )
+            self.bump_version(connection, dataset)
+
+    # Play by play rows have no key of their own, so a game's rows replace all
+    # of its old ones. Its lineups are rebuilt along with it.
+    def add_play_by_play(self, rows: List[Dict[str, str]]):
+        games: Dict[str, List[Dict[str, str]]] = defaultdict(list)
+        for row in rows:
+            games[row["gameID"]].append(row)
+
+        with self.transaction() as connection:
+            for game_id, game_rows in games.items():
+                for dataset in ["play_by_play", "lineups"]:
+                    connection.execute(
+                        "DELETE FROM records WHERE dataset = ? AND game = ?",
+                        (dataset, game_id),
+                    )
+
+                connection.executemany(
+                    "INSERT INTO records VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        self.record("play_by_play", f"{game_id}:{index}", row)
+                        for index, row in enumerate(game_rows)
+                    ),
+                )
+                connection.executemany(
+                    "INSERT INTO records VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        self.record("lineups", f"{game_id}:{key}", lineup)
+                        for key, lineup in get_lineups(game_rows).items()
+                    ),
+                )
+
+            self.bump_version(connection, "play_by_play")
+            self.bump_version(connection, "lineups")
+
+    def record(self, dataset: str, key: str, row: Dict[str, str]) -> Tuple:
+        fields = datasets[dataset]
+
+        def get(field: Optional[str]) -> Optional[str]:
+            return row.get(field) if field else None
+
+        date = get(fields.date)
+        return (
+            dataset,
+            key,
+            get(fields.game),
+            get(fields.home_team),
+            get(fields.away_team),
+            get(fields.player),
+            # Only the day is indexed, not the time.
+            date[:10] if date else None,
+            json.dumps(row),
+        )
+
+    def bump_version(self, connection: sqlite3.Connection, dataset: str):
+        connection.execute(
+            "INSERT INTO versions VALUES (?, 1) "
+            "ON CONFLICT (dataset) DO UPDATE SET version = version + 1",
+            (dataset,),
+        )
+
+
+# Sum up each lineup of a game from its play by play rows.
+def get_lineups(rows: List[Dict[str, str]]) -> Dict[str, Dict[str, Any]]:
+    lineups: Dict[str, Dict[str, Any]] = dict()
+
+    for row in rows:
+        if row.get("isMirroredEvent") == "TRUE":
+            continue
+
+        for team in ["home", "visitor"]:
+            uid = row.get(f"{team}PlayerUID")
+            if not uid:
+                continue
+
+            key = "{}:{}".format(row.get(f"{team}TeamID"), uid)
+            if key not in lineups:
+                players = []
+                i = 1
+                while player := row.get(f"{team}Player{i}"):
+                    players.append(player)
+                    i += 1
+
+                lineups[key] = {
+                    "gameID": row["gameID"],
+                    "teamID": row.get(f"{team}TeamID"),
+                    "teamName": row.get(f"{team}TeamName"),
+                    "lineupUID": uid,
+                    "players": players,
+                    "events": 0,
+                }
+
+            lineups[key]["events"] += 1
+
+    return lineups
@@ -0,0 +1,225 @@
+import json
+import os
+import re
+from collections import Counter
+from dataclasses import asdict, dataclass
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Set, Tuple
+
+# Name words ESPN and the NCAA both shorten to "st".
+st_words = {"st", "state", "saint"}
+
+# Name words that go on with the school's name rather than start ESPN's mascot,
+# so "Michigan State Spartans" is not "Michigan". The "a" is from "A&M".
+school_words = st_words | {"tech", "a"}
+
+
+@dataclass
+class TeamEntry:
+    espn_id: str
+    espn_name: str
+    ncaa_id: str
+    ncaa_name: str
+
+
+# The two teams of a game, as one source sees it.
+@dataclass
+class GameTeams:
+    game_id: str
+    home_id: str
+    home_name: str
+    home_score: str
+    away_id: str
+    away_name: str
+    away_score: str
+
+
+# Which NCAA team each ESPN team is, kept in a JSON file. Teams are matched by
+# name the first time they are seen, and by ID from then on. A kept team is
+# trusted from then on, so only teams whose own names match word for word are
+# kept. Teams that only look alike, or only matched along with the other team
+# of their game, still match games but have to be matched again next time.
+class TeamMapping:
+    def __init__(self, path: str):
+        self.path = path
+        self.teams: Dict[str, TeamEntry] = dict()
+
+        if os.path.exists(path):
+            with open(path, "r", encoding="UTF-8") as mapping_file:
+                for entry in json.load(mapping_file):
+                    team = TeamEntry(**entry)
+                    self.teams[team.espn_id] = team
+
+    def __enter__(self) -> "TeamMapping":
+        return self
+
+    def __exit__(self, *args):
+        self.save()
+
+    def ncaa_id(self, espn_id: str) -> Optional[str]:
+        if team := self.teams.get(espn_id):
+            return team.ncaa_id
+        return None
+
+    def add(self, espn_id: str, espn_name: str, ncaa_id: str, ncaa_name: str):
+        self.teams[espn_id] = TeamEntry(espn_id, espn_name, ncaa_id, ncaa_name)
+
+    def save(self):
+        teams = sorted(self.teams.values(), key=lambda team: team.espn_name)
+
+        # Write to a new file first, so a failed save keeps the old mapping.
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="UTF-8") as mapping_file:
+            json.dump([asdict(team) for team in teams], mapping_file, indent=2)
+        os.replace(temp_path, self.path)
+
+    # Pair up the ESPN and NCAA games of one day. Each match says whether the
+    # NCAA has the home and away teams the other way around, like it can for
+    # games at neutral sites.
+    def match_games(
+        self,
+        espn_games: List[GameTeams],
+        ncaa_games: List[GameTeams],
+        min_similarity: float = 0.8,
+    ) -> List[Tuple[GameTeams, GameTeams, bool]]:
+        matches: List[Tuple[GameTeams, GameTeams, bool]] = list()
+
+        # Games between teams that are both known are found right away.
+        ncaa_by_teams = {
+            frozenset([game.home_id, game.away_id]): game for game in ncaa_games
+        }
+        unmatched_espn = list()
+        for espn_game in espn_games:
+            home_id = self.ncaa_id(espn_game.home_id)
+            away_id = self.ncaa_id(espn_game.away_id)
+            ncaa_game = None
+            if home_id and away_id:
+                ncaa_game = ncaa_by_teams.pop(frozenset([home_id, away_id]), None)
+
+            if ncaa_game:
+                matches.append((espn_game, ncaa_game, ncaa_game.home_id != home_id))
+            else:
+                unmatched_espn.append(espn_game)
+
+        # The rest are matched by name, best matches first.
+        unmatched_ncaa = list(ncaa_by_teams.values())
+        candidates: Dict[float, List[Tuple[GameTeams, GameTeams, bool]]] = dict()
+        for espn_game in unmatched_espn:
+            for ncaa_game in unmatched_ncaa:
+                for swapped in [False, True]:
+                    similarity = self.game_similarity(espn_game, ncaa_game, swapped)
+                    if similarity >= min_similarity:
+                        candidates.setdefault(similarity, list()).append(
+                            (espn_game, ncaa_game, swapped)
+                        )
+
+        used_espn: Set[str] = set()
+        used_ncaa: Set[str] = set()
+        for similarity in sorted(candidates, reverse=True):
+            tied = [
+                (espn_game, ncaa_game, swapped)
+                for espn_game, ncaa_game, swapped in candidates[similarity]
+                if espn_game.game_id not in used_espn
+                and ncaa_game.game_id not in used_ncaa
+            ]
+            # A game that matches more than one other game equally well can't
+            # be told apart, so neither is matched.
+            espn_counts = Counter(espn_game.game_id for espn_game, _, _ in tied)
+            ncaa_counts = Counter(ncaa_game.game_id for _, ncaa_game, _ in tied)
+
+            for espn_game, ncaa_game, swapped in tied:
+                used_espn.add(espn_game.game_id)
+                used_ncaa.add(ncaa_game.game_id)
+
+                if (
+                    espn_counts[espn_game.game_id] > 1
+                    or ncaa_counts[ncaa_game.game_id] > 1
+                ):
+                    print(
+                        "WARNING: ESPN game {} and NCAA game {} tie with another "
+                        "match".format(espn_game.game_id, ncaa_game.game_id)
+                    )
+                    continue
+
+                matches.append((espn_game, ncaa_game, swapped))
+                self.add_game(espn_game, ncaa_game, swapped)
+
+        return matches
+
+    # How alike the teams of two games are, from 0 to 1. Games that ended
+    # with the same score only need one team to look alike, as long as the
+    # other is not known to be a different team.
+    def game_similarity(
+        self, espn_game: GameTeams, ncaa_game: GameTeams, swapped: bool
+    ) -> float:
+        ncaa_home, ncaa_away = ncaa_teams(ncaa_game, swapped)
+        similarities = [
+            self.team_similarity(espn_game.home_id, espn_game.home_name, ncaa_home),
+            self.team_similarity(espn_game.away_id, espn_game.away_name, ncaa_away),
+        ]
+        if min(similarities) == 0.0:
+            return 0.0
+
+        espn_scores = (espn_game.home_score, espn_game.away_score)
+        if espn_game.home_score and espn_scores == (ncaa_home[2], ncaa_away[2]):
+            return max(similarities)
+        return min(similarities)
+
+    def team_similarity(
+        self, espn_id: str, espn_name: str, ncaa_team: Tuple[str, str, str]
+    ) -> float:
+        ncaa_id, ncaa_name, _ = ncaa_team
+        if known_id := self.ncaa_id(espn_id):
+            return 1.0 if known_id == ncaa_id else 0.0
+        return name_similarity(espn_name, ncaa_name)
+
+    # Keep the teams of a matched game whose names match word for word.
+    def add_game(self, espn_game: GameTeams, ncaa_game: GameTeams, swapped: bool):
+        ncaa_home, ncaa_away = ncaa_teams(ncaa_game, swapped)
+        for espn_id, espn_name, (ncaa_id, ncaa_name, _) in [
+            (espn_game.home_id, espn_game.home_name, ncaa_home),
+            (espn_game.away_id, espn_game.away_name, ncaa_away),
+        ]:
+            if espn_id in self.teams:
+                continue
+            if name_similarity(espn_name, ncaa_name) == 1.0:
+                self.add(espn_id, espn_name, ncaa_id, ncaa_name)
+
+
+# The (ID, name, score) of the NCAA teams, in the ESPN home and away order.
+def ncaa_teams(
+    game: GameTeams, swapped: bool
+) -> Tuple[Tuple[str, str, str], Tuple[str, str, str]]:
+    home = (game.home_id, game.home_name, game.home_score)
+    away = (game.away_id, game.away_name, game.away_score)
+    return (away, home) if swapped else (home, away)
+
+
+def name_words(name: str) -> List[str]:
+    name = name.lower().replace("&", " and ").replace("'", "")
+    return re.findall(r"[a-z0-9]+", name)
+
+
+# How alike an ESPN team name (Eg: "Michigan State Spartans") and an NCAA one
+# (Eg: "Michigan St.") are, from 0 to 1. ESPN adds the mascot, so only the
+# start of its name is compared.
+def name_similarity(espn_name: str, ncaa_name: str) -> float:
+    espn_words = name_words(espn_name)
+    ncaa_words = name_words(ncaa_name)
+    if not espn_words or not ncaa_words:
+        return 0.0
+
+    compared_words = len(ncaa_words)
+    if len(ncaa_words) <= len(espn_words) and all(
+        espn_word == ncaa_word or {espn_word, ncaa_word} <= st_words
+        for espn_word, ncaa_word in zip(espn_words, ncaa_words)
+    ):
+        rest = espn_words[len(ncaa_words) :]
+        if not rest or rest[0] not in school_words:
+            return 1.0
+        # The ESPN school name goes on, so it is likely another school with a
+        # longer name. Compare all of it.
+        compared_words = len(espn_words)
+
+    espn_start = " ".join(espn_words[:compared_words])
+    return SequenceMatcher(None, espn_start, " ".join(ncaa_words)).ratio()
@@ -1,37 +1,205 @@
 import asyncio
+import contextlib
 import csv
-from typing import Dict, List
+import os
+import random
+import time
+from typing import (
+    TYPE_CHECKING,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+)
 
-import aiohttp
+from ncaa_basketball.archive import Archive
+from ncaa_basketball.compression import compression_for_path, open_input, open_output
+from ncaa_basketball.limiter import AdaptiveLimiter
+from ncaa_basketball.single_flight import SingleFlight
 
+# aiohttp takes longer to import than everything else put together, so it is
+# only imported once something is downloaded. Commands start faster that way.
+if TYPE_CHECKING:
+    import aiohttp
 
-def write_data_to_csv(data: List[Dict[str, str]], output_path: str):
-    # Get all field names in the data dictionaries.
-    fieldnames = list(set().union(*(d.keys() for d in data)))
-    fieldnames.sort()
 
-    with open(output_path, "w", newline="", encoding="UTF-8") as csvfile:
+# Write rows to a CSV file. With declared fieldnames the header is written
+# right away and rows are streamed; without them all rows are scanned first.
+# Fields the declared ones miss are not lost: they are added as new columns at
+# the end, which takes writing the file a second time.
+# The file is compressed if asked to, or if its name ends with .gz or .zst.
+def write_data_to_csv(
+    data: Iterable[Dict[str, str]],
+    output_path: str,
+    fieldnames: List[str] | None = None,
+    compression: str | None = None,
+):
+    if fieldnames is None:
+        # Get all field names in the data dictionaries.
+        data = list(data)
+        fieldnames = list(set().union(*(d.keys() for d in data)))
+        fieldnames.sort()
+
+    known_fields = set(fieldnames)
+    # Values of fields missing from the schema, by row number.
+    extra_values: Dict[int, Dict[str, str]] = dict()
+
+    with open_output(output_path, compression) as csvfile:
         writer = csv.DictWriter(
             csvfile,
             fieldnames=fieldnames,
             delimiter=",",
             quotechar='"',
             quoting=csv.QUOTE_MINIMAL,
+            extrasaction="ignore",
         )
         writer.writeheader()
+
+        for index, row in enumerate(data):
+            if extra := row.keys() - known_fields:
+                extra_values[index] = {field: row[field] for field in extra}
+            writer.writerow(row)
+
+    if extra_values:
+        extra_fields = sorted(set().union(*extra_values.values()))
+        print("WARNING: adding fields missing from the schema {}".format(extra_fields))
+        add_columns(output_path, fieldnames + extra_fields, extra_values, compression)
+
+
+# Write a CSV file again with more columns, filling them in from the values
+# given for each row number.
+def add_columns(
+    output_path: str,
+    fieldnames: List[str],
+    values: Dict[int, Dict[str, str]],
+    compression: str | None = None,
+):
+    compression = compression or compression_for_path(output_path)
+    temp_path = output_path + ".tmp"
+
+    with (
+        open_input(output_path) as infile,
+        open_output(temp_path, compression) as outfile,
+    ):
+        writer = csv.DictWriter(
+            outfile,
+            fieldnames=fieldnames,
+            delimiter=",",
+            quotechar='"',
+            quoting=csv.QUOTE_MINIMAL,
+        )
+        writer.writeheader()
+        for index, row in enumerate(csv.DictReader(infile)):
+            writer.writerow(row | values.get(index, {}))
+
+    os.replace(temp_path, output_path)
+
+
+# Write columns of values to a CSV file, one row for each position in them.
+# Columns the fieldnames miss are added at the end, like write_data_to_csv does.
+def write_columns_to_csv(
+    columns: Mapping[str, Iterable[str]],
+    output_path: str,
+    fieldnames: List[str],
+    compression: str | None = None,
+):
+    if extra_fields := sorted(columns.keys() - set(fieldnames)):
+        print("WARNING: adding fields missing from the schema {}".format(extra_fields))
+        fieldnames = fieldnames + extra_fields
+
+    with open_output(output_path, compression) as csvfile:
+        writer = csv.writer(
+            csvfile, delimiter=",", quotechar='"', quoting=csv.QUOTE_MINIMAL
+        )
+        writer.writerow(fieldnames)
+        writer.writerows(zip(*(columns[name] for name in fieldnames)))
+
+
+# Add rows to the end of a CSV file, writing the header first if it is new.
+def append_data_to_csv(
+    data: Iterable[Dict[str, str]], output_path: str, fieldnames: List[str]
+):
+    with open(output_path, "a", newline="", encoding="UTF-8") as csvfile:
+        writer = csv.DictWriter(
+            csvfile,
+            fieldnames=fieldnames,
+            delimiter=",",
+            quotechar='"',
+            quoting=csv.QUOTE_MINIMAL,
+            extrasaction="ignore",
+        )
+        if csvfile.tell() == 0:
+            writer.writeheader()
         writer.writerows(data)
 
 
-async def get_url(session: aiohttp.ClientSession, url: str) -> str:
+# Read rows back from a CSV file written by write_data_to_csv.
+def read_data_from_csv(input_path: str) -> Iterator[Dict[str, str]]:
+    with open_input(input_path) as csvfile:
+        yield from csv.DictReader(csvfile)
+
+
+# Open the archive at the path, or give None if there is no path.
+@contextlib.contextmanager
+def open_archive(path: Optional[str]) -> Iterator[Optional[Archive]]:
+    if not path:
+        yield None
+        return
+
+    with Archive(path) as archive:
+        yield archive
+
+
+# Shared by all downloads, so the limit it finds applies to the whole program.
+limiter = AdaptiveLimiter()
+
+# Parsed pages, shared by everything that asks for the same URL at once.
+shared_fetches = SingleFlight()
+
+
+# Start a session to download with.
+def client_session() -> "aiohttp.ClientSession":
+    import aiohttp
+
+    return aiohttp.ClientSession()
+
+
+async def get_url(session: "aiohttp.ClientSession", url: str) -> str:
+    import aiohttp
+
     retries = 0
     while True:
+        retry_after = 0.0
         try:
-            async with session.get(url) as resp:
-                if resp.status >= 500:
-                    resp.raise_for_status()
-                return await resp.text()
-        except aiohttp.ClientError as e:
+            async with limiter:
+                start = time.monotonic()
+                try:
+                    async with session.get(url) as resp:
+                        if resp.status == 429:
+                            retry_after = parse_retry_after(resp.headers)
+                        if resp.status >= 500 or resp.status == 429:
+                            resp.raise_for_status()
+                        text = await resp.text()
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    if isinstance(e, aiohttp.ClientResponseError):
+                        limiter.record_failure(str(e.status))
+                    else:
+                        limiter.record_failure(type(e).__name__)
+                    raise e
+                limiter.record_success(time.monotonic() - start)
+                return text
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
             retries += 1
             if retries > 3:
                 raise e
-            await asyncio.sleep(1)
+            # Back off exponentially, with jitter so retries don't all line up.
+            await asyncio.sleep(max(retry_after, 2 ** (retries - 1) * random.random()))
+
+
+def parse_retry_after(headers) -> float:
+    try:
+        return float(headers.get("Retry-After", 0))
+    except ValueError:
+        return 0.0